@@ -3,6 +3,7 @@ from langchain_ollama import ChatOllama
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from config import settings
+from prompt_warmup import prefill
 import os
 from datetime import datetime
 import asyncio
@@ -13,22 +14,13 @@ logger = logging.getLogger(__name__)
 class Answerer:
     """Class to handle answer generation."""
     def __init__(self):
+        # The instructions are the static prefix Ollama can keep in its KV cache,
+        # so everything that changes per request comes after them
         self._prompt = PromptTemplate(
             input_variables=["question", "context", "stack_trace", "code_context"],
             template="""
 Based on the user's query and the logs provided, determine the appropriate response.
 
-USER QUESTION: {question}
-
-LOGS CONTEXT:
-{context}
-
-STACK TRACE:
-{stack_trace}
-
-CODE CONTEXT:
-{code_context}
-
 INSTRUCTIONS:
 Please provide:
 1. A direct answer to the user's question, if possible (e.g., confirmation of an event or status). If the logs contain information that directly answers the user's question, state it clearly.
@@ -42,6 +34,17 @@ Please provide:
    - Product record IDs (rec_id)
 
 Focus on providing a clear and direct response to the user's question, supplemented by technical insights when necessary. Make sure to explicitly list all relevant identifiers from the error payload.
+
+USER QUESTION: {question}
+
+LOGS CONTEXT:
+{context}
+
+STACK TRACE:
+{stack_trace}
+
+CODE CONTEXT:
+{code_context}
 """
         )
 
@@ -49,7 +52,8 @@ Focus on providing a clear and direct response to the user's question, supplemen
             base_url=settings.answerer_ollama_base_url,
             model=settings.answerer_ollama_model,
             temperature=settings.answerer_ollama_temperature,
-            num_ctx=settings.answerer_ollama_num_ctx
+            num_ctx=settings.answerer_ollama_num_ctx,
+            keep_alive=settings.ollama_keep_alive
         )
 
         self.chain = self._prompt | self._llm | StrOutputParser()
@@ -77,6 +81,13 @@ Focus on providing a clear and direct response to the user's question, supplemen
         except Exception as e:
             logger.error(f"Error while debugging prompt: {str(e)}")
 
+    async def awarmup(self) -> float:
+        """Load the model and prefill the instructions; returns the time taken."""
+        return await prefill(
+            self._prompt | self._llm,
+            {"question": "", "context": "", "stack_trace": "", "code_context": ""}
+        )
+
     def astream(self, inputs: dict):
         """Stream the answer generation."""
         self._debug_prompt(inputs)
@@ -105,8 +116,8 @@ def parse_debug_file(content: str) -> tuple[str, str, str, str]:
     stack_trace_match = re.search(r"STACK TRACE:\s*(.*?)\n\s*CODE CONTEXT:", content, re.DOTALL)
     stack_trace = stack_trace_match.group(1).strip() if stack_trace_match else ""
 
-    # Find the code context
-    code_context_match = re.search(r"CODE CONTEXT:\s*(.*?)\n\s*INSTRUCTIONS:", content, re.DOTALL)
+    # Find the code context (older debug files have the instructions after it)
+    code_context_match = re.search(r"CODE CONTEXT:\s*(.*?)(?:\n\s*INSTRUCTIONS:|\Z)", content, re.DOTALL)
     code_context = code_context_match.group(1).strip() if code_context_match else ""
 
     return question, context, stack_trace, code_context
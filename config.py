@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -8,6 +8,16 @@ class Settings(BaseSettings):
     # Telegram settings
     telegram_bot_token: str = Field(json_schema_extra={"env": "TELEGRAM_BOT_TOKEN"})
     
+    # "polling" runs a single long-poll loop, "webhook" serves a webhook and fans updates out to worker processes
+    telegram_mode: Literal["polling", "webhook"] = Field(default="polling", json_schema_extra={"env": "TELEGRAM_MODE"})
+    webhook_base_url: str = Field(default="", json_schema_extra={"env": "WEBHOOK_BASE_URL"})
+    webhook_path: str = Field(default="/telegram/webhook", json_schema_extra={"env": "WEBHOOK_PATH"})
+    webhook_host: str = Field(default="0.0.0.0", json_schema_extra={"env": "WEBHOOK_HOST"})
+    webhook_port: int = Field(default=8080, json_schema_extra={"env": "WEBHOOK_PORT"})
+    webhook_secret: str = Field(default="", json_schema_extra={"env": "WEBHOOK_SECRET"})
+    webhook_max_connections: int = Field(default=40, json_schema_extra={"env": "WEBHOOK_MAX_CONNECTIONS"})
+    webhook_workers: int = Field(default=2, json_schema_extra={"env": "WEBHOOK_WORKERS"})
+    
     # Answerer Ollama settings
     answerer_ollama_base_url: str = Field(default="http://127.0.0.1:11434", json_schema_extra={"env": "ANSWERER_OLLAMA_BASE_URL"})
     #1. deepcoder
@@ -15,6 +25,12 @@ class Settings(BaseSettings):
     answerer_ollama_model: str = Field(default="deepcoder", json_schema_extra={"env": "ANSWERER_OLLAMA_MODEL"})
     answerer_ollama_temperature: float = Field(default=0, json_schema_extra={"env": "ANSWERER_OLLAMA_TEMPERATURE"})
     answerer_ollama_num_ctx: int = Field(default=65536, json_schema_extra={"env": "ANSWERER_OLLAMA_NUM_CTX"})
+    # "per_document" answers every relevant document separately, "consolidated" answers them all at once
+    answer_mode: Literal["per_document", "consolidated"] = Field(default="per_document", json_schema_extra={"env": "ANSWER_MODE"})
+    answer_context_budget_tokens: int = Field(default=16000, json_schema_extra={"env": "ANSWER_CONTEXT_BUDGET_TOKENS"})
+    answer_streaming: bool = Field(default=True, json_schema_extra={"env": "ANSWER_STREAMING"})
+    answer_stream_edit_interval: float = Field(default=1.0, json_schema_extra={"env": "ANSWER_STREAM_EDIT_INTERVAL"})
+    answer_stream_min_chars: int = Field(default=80, json_schema_extra={"env": "ANSWER_STREAM_MIN_CHARS"})
 
     # Log Summarizer Ollama settings
     log_summarizer_ollama_base_url: str = Field(default="http://127.0.0.1:11434", json_schema_extra={"env": "LOG_SUMMARIZER_OLLAMA_BASE_URL"})
@@ -33,6 +49,7 @@ class Settings(BaseSettings):
     retrieval_grader_ollama_model: str = Field(default="qwen2.5-coder", json_schema_extra={"env": "RETRIEVER_OLLAMA_MODEL"})
     retrieval_grader_ollama_temperature: float = Field(default=0, json_schema_extra={"env": "RETRIEVAL_GRADER_OLLAMA_TEMPERATURE"})
     retrieval_grader_ollama_num_ctx: int = Field(default=8192, json_schema_extra={"env": "RETRIEVAL_GRADER_OLLAMA_NUM_CTX"})
+    retrieval_grader_concurrency: int = Field(default=4, json_schema_extra={"env": "RETRIEVAL_GRADER_CONCURRENCY"})
     
     # Question Rewriter Ollama settings
     question_rewriter_ollama_base_url: str = Field(default="http://127.0.0.1:11434", json_schema_extra={"env": "QUESTION_REWRITER_OLLAMA_BASE_URL"})
@@ -61,6 +78,43 @@ class Settings(BaseSettings):
     opensearch_use_ssl: bool = Field(json_schema_extra={"env": "OPENSEARCH_USE_SSL"})
     opensearch_verify_certs: bool = Field(json_schema_extra={"env": "OPENSEARCH_VERIFY_CERTS"})
     opensearch_query_size: int = Field(default=10, json_schema_extra={"env": "OPENSEARCH_QUERY_SIZE"})
+    # Shared client pools: connections per client, request timeout in seconds and retries
+    opensearch_pool_maxsize: int = Field(default=10, json_schema_extra={"env": "OPENSEARCH_POOL_MAXSIZE"})
+    opensearch_timeout: int = Field(default=30, json_schema_extra={"env": "OPENSEARCH_TIMEOUT"})
+    opensearch_max_retries: int = Field(default=3, json_schema_extra={"env": "OPENSEARCH_MAX_RETRIES"})
+    opensearch_retry_on_timeout: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_RETRY_ON_TIMEOUT"})
+    opensearch_keep_alive: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_KEEP_ALIVE"})
+    # Return only the msg fragments matching the query, plus the stack trace section, instead of whole messages
+    opensearch_highlight_enabled: bool = Field(default=False, json_schema_extra={"env": "OPENSEARCH_HIGHLIGHT_ENABLED"})
+    opensearch_highlight_fragment_size: int = Field(default=300, json_schema_extra={"env": "OPENSEARCH_HIGHLIGHT_FRAGMENT_SIZE"})
+    opensearch_highlight_fragments: int = Field(default=3, json_schema_extra={"env": "OPENSEARCH_HIGHLIGHT_FRAGMENTS"})
+    opensearch_stack_trace_max_chars: int = Field(default=4000, json_schema_extra={"env": "OPENSEARCH_STACK_TRACE_MAX_CHARS"})
+    # Page through all hits in time order (point in time + search_after) instead of taking the top opensearch_query_size
+    opensearch_streaming_enabled: bool = Field(default=False, json_schema_extra={"env": "OPENSEARCH_STREAMING_ENABLED"})
+    opensearch_page_size: int = Field(default=100, json_schema_extra={"env": "OPENSEARCH_PAGE_SIZE"})
+    opensearch_stream_max_documents: int = Field(default=1000, json_schema_extra={"env": "OPENSEARCH_STREAM_MAX_DOCUMENTS"})
+    opensearch_pit_keep_alive: str = Field(default="1m", json_schema_extra={"env": "OPENSEARCH_PIT_KEEP_ALIVE"})
+    # Search only the daily indices of the query's days and namespaces, e.g. "bus-{ns}-info-{date}" (empty searches opensearch_index)
+    opensearch_daily_index_pattern: str = Field(default="", json_schema_extra={"env": "OPENSEARCH_DAILY_INDEX_PATTERN"})
+    opensearch_index_date_format: str = Field(default="%m-%d", json_schema_extra={"env": "OPENSEARCH_INDEX_DATE_FORMAT"})
+    opensearch_index_time_zone: str = Field(default="+00:00", json_schema_extra={"env": "OPENSEARCH_INDEX_TIME_ZONE"})
+    opensearch_max_resolved_indices: int = Field(default=31, json_schema_extra={"env": "OPENSEARCH_MAX_RESOLVED_INDICES"})
+    opensearch_index_list_ttl_seconds: int = Field(default=300, json_schema_extra={"env": "OPENSEARCH_INDEX_LIST_TTL_SECONDS"})
+    # Pin now-relative bounds to absolute times rounded to this many seconds (0 keeps them) and let shards cache repeated searches
+    opensearch_time_rounding_seconds: int = Field(default=60, json_schema_extra={"env": "OPENSEARCH_TIME_ROUNDING_SECONDS"})
+    opensearch_request_cache: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_REQUEST_CACHE"})
+    # In-process cache of found documents: TTL for ranges reaching up to now and for past ranges, and size caps
+    opensearch_result_cache_enabled: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_RESULT_CACHE_ENABLED"})
+    opensearch_result_cache_recent_ttl_seconds: float = Field(default=30, json_schema_extra={"env": "OPENSEARCH_RESULT_CACHE_RECENT_TTL_SECONDS"})
+    opensearch_result_cache_historical_ttl_seconds: float = Field(default=3600, json_schema_extra={"env": "OPENSEARCH_RESULT_CACHE_HISTORICAL_TTL_SECONDS"})
+    opensearch_result_cache_max_entries: int = Field(default=512, json_schema_extra={"env": "OPENSEARCH_RESULT_CACHE_MAX_ENTRIES"})
+    opensearch_result_cache_max_megabytes: float = Field(default=64, json_schema_extra={"env": "OPENSEARCH_RESULT_CACHE_MAX_MEGABYTES"})
+    # Collapse hits on a message fingerprint keyword (filled by fingerprint_pipeline.py), so every hit is a distinct message
+    opensearch_collapse_enabled: bool = Field(default=False, json_schema_extra={"env": "OPENSEARCH_COLLAPSE_ENABLED"})
+    opensearch_fingerprint_field: str = Field(default="msg_template", json_schema_extra={"env": "OPENSEARCH_FINGERPRINT_FIELD"})
+    # Answer counting and trend questions from server-side aggregations instead of raw hits
+    aggregation_mode_enabled: bool = Field(default=True, json_schema_extra={"env": "AGGREGATION_MODE_ENABLED"})
+    aggregation_terms_size: int = Field(default=10, json_schema_extra={"env": "AGGREGATION_TERMS_SIZE"})
     
     # MongoDB settings
     mongodb_hosts: List[str] = Field(default=["rc1a-f63tuonbafbitiww.mdb.yandexcloud.net:27018"], json_schema_extra={"env": "MONGODB_HOSTS"})
@@ -85,6 +139,34 @@ class Settings(BaseSettings):
     codebase_language: str = Field(default="js", json_schema_extra={"env": "CODEBASE_LANGUAGE"})
     codebase_embedding_model: str = Field(default="unclemusclez/jina-embeddings-v2-base-code", json_schema_extra={"env": "CODEBASE_EMBEDDING_MODEL"})
     codebase_k: int = Field(default=1, json_schema_extra={"env": "CODEBASE_K"})
+
+    # Workflow pipeline settings
+    code_lookup_concurrency: int = Field(default=2, json_schema_extra={"env": "CODE_LOOKUP_CONCURRENCY"})
+    answerer_concurrency: int = Field(default=1, json_schema_extra={"env": "ANSWERER_CONCURRENCY"})
+    pipeline_queue_size: int = Field(default=2, json_schema_extra={"env": "PIPELINE_QUEUE_SIZE"})
+    # Time budget per question in seconds (0 disables it) and how many relevant documents to answer (0 for all)
+    question_deadline_seconds: float = Field(default=180, json_schema_extra={"env": "QUESTION_DEADLINE_SECONDS"})
+    max_answered_documents: int = Field(default=5, json_schema_extra={"env": "MAX_ANSWERED_DOCUMENTS"})
+    log_clustering_enabled: bool = Field(default=True, json_schema_extra={"env": "LOG_CLUSTERING_ENABLED"})
+    # Occurrences listed per clustered log message (0 for all); further repeats are only counted
+    log_cluster_max_occurrences: int = Field(default=20, json_schema_extra={"env": "LOG_CLUSTER_MAX_OCCURRENCES"})
+
+    # Request scheduler settings; in webhook mode the LLM cap is split between the workers
+    llm_max_concurrency: int = Field(default=4, json_schema_extra={"env": "LLM_MAX_CONCURRENCY"})
+    scheduler_cancel_previous: bool = Field(default=False, json_schema_extra={"env": "SCHEDULER_CANCEL_PREVIOUS"})
+
+    # Response cache settings
+    response_cache_enabled: bool = Field(default=True, json_schema_extra={"env": "RESPONSE_CACHE_ENABLED"})
+    response_cache_ttl_seconds: float = Field(default=300, json_schema_extra={"env": "RESPONSE_CACHE_TTL_SECONDS"})
+    response_cache_max_entries: int = Field(default=256, json_schema_extra={"env": "RESPONSE_CACHE_MAX_ENTRIES"})
+    response_cache_time_granularity_seconds: int = Field(default=60, json_schema_extra={"env": "RESPONSE_CACHE_TIME_GRANULARITY_SECONDS"})
+
+    # Prompt prefix reuse: how long Ollama keeps models loaded and whether to prefill prompts at startup
+    ollama_keep_alive: str = Field(default="30m", json_schema_extra={"env": "OLLAMA_KEEP_ALIVE"})
+    prompt_warmup_enabled: bool = Field(default=True, json_schema_extra={"env": "PROMPT_WARMUP_ENABLED"})
+
+    # Progress reporting settings
+    progress_edit_interval: float = Field(default=1.5, json_schema_extra={"env": "PROGRESS_EDIT_INTERVAL"})
     
     # MongoDB Retriever Ollama settings
     mongodb_retriever_ollama_base_url: str = Field(default="http://127.0.0.1:11434", json_schema_extra={"env": "MONGODB_RETRIEVER_OLLAMA_BASE_URL"})
@@ -97,6 +179,23 @@ class Settings(BaseSettings):
     opensearch_retriever_ollama_model: str = Field(default="qwen2.5-coder", json_schema_extra={"env": "OPENSEARCH_RETRIEVER_OLLAMA_MODEL"})
     opensearch_retriever_ollama_temperature: float = Field(default=0, json_schema_extra={"env": "OPENSEARCH_RETRIEVER_OLLAMA_TEMPERATURE"})
     opensearch_retriever_ollama_num_ctx: int = Field(default=8192, json_schema_extra={"env": "OPENSEARCH_RETRIEVER_OLLAMA_NUM_CTX"})
+    # Translate common question shapes with a rule-based parser and only call the LLM when it is not confident
+    opensearch_fast_path_enabled: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_FAST_PATH_ENABLED"})
+    # Few-shot examples sent per translation (0 sends all) and an optional JSON file of extra curated examples
+    opensearch_examples_k: int = Field(default=4, json_schema_extra={"env": "OPENSEARCH_EXAMPLES_K"})
+    opensearch_examples_path: str = Field(default="", json_schema_extra={"env": "OPENSEARCH_EXAMPLES_PATH"})
+    opensearch_pinned_examples: int = Field(default=3, json_schema_extra={"env": "OPENSEARCH_PINNED_EXAMPLES"})
+    # Generated queries without a time bound are limited to this window (date math unit, e.g. "7d"); empty rejects them
+    opensearch_default_time_window: str = Field(default="7d", json_schema_extra={"env": "OPENSEARCH_DEFAULT_TIME_WINDOW"})
+    # Race the translation cache, the rule-based parser and the LLM instead of trying them in turn
+    opensearch_speculative_translation: bool = Field(default=True, json_schema_extra={"env": "OPENSEARCH_SPECULATIVE_TRANSLATION"})
+    # Questions translated at the same time by construct_queries/aconstruct_queries
+    translation_batch_concurrency: int = Field(default=4, json_schema_extra={"env": "TRANSLATION_BATCH_CONCURRENCY"})
+    # LLM translations are cached by normalized question and saved to a file (empty path keeps them in memory)
+    translation_cache_enabled: bool = Field(default=True, json_schema_extra={"env": "TRANSLATION_CACHE_ENABLED"})
+    translation_cache_path: str = Field(default="translation_cache.json", json_schema_extra={"env": "TRANSLATION_CACHE_PATH"})
+    translation_cache_max_entries: int = Field(default=2048, json_schema_extra={"env": "TRANSLATION_CACHE_MAX_ENTRIES"})
+    translation_cache_save_delay_seconds: float = Field(default=5, json_schema_extra={"env": "TRANSLATION_CACHE_SAVE_DELAY_SECONDS"})
 
     model_config = SettingsConfigDict(
         env_file='.env',
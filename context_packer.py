@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from log_clusterer import format_occurrences
+
+# Rough size of a token for the models we run, used to keep prompts within budget
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough for budgeting prompts."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class PackedContext:
+    """Answerer inputs built from several documents."""
+    context: str = ""
+    stack_trace: str = ""
+    code_context: str = ""
+    packed: int = 0
+    skipped: int = 0
+    tokens: int = 0
+    code_sources: List[str] = field(default_factory=list)
+
+
+def rank_documents(relevant: List[Tuple[int, Document, List[Document]]]) -> List[Tuple[int, Document, List[Document]]]:
+    """Order documents graded relevant by OpenSearch score, then by retrieval order."""
+    return sorted(relevant, key=lambda item: (-(item[1].metadata.get("score") or 0), item[0]))
+
+
+def pack_context(ranked: List[Tuple[int, Document, List[Document]]], budget_tokens: int) -> PackedContext:
+    """Pack ranked documents and their code snippets into one answerer prompt.
+
+    Documents are added in order while they fit into `budget_tokens`. Code
+    snippets shared by several documents are included once; when a
+    document's snippets do not fit, the document is added without them.
+    The first document is truncated rather than dropped.
+    """
+    packed = PackedContext()
+    logs: List[str] = []
+    stacks: List[str] = []
+    snippets: List[str] = []
+
+    for doc_num, doc, code_docs in ranked:
+        meta = doc.metadata
+        log_block = f"Log Entry {doc_num} (level: {meta.get('level')}, ns: {meta.get('ns')}, svc: {meta.get('svc')}, time: {meta.get('time')}):\n{doc.page_content}"
+        occurrences = format_occurrences(doc)
+        if occurrences:
+            log_block = f"{log_block}\n{occurrences}"
+        stack_block = f"Log Entry {doc_num}:\n{meta['stack_trace']}" if meta.get("stack_trace") else ""
+
+        new_code = [
+            code_doc for code_doc in code_docs
+            if code_doc.metadata.get("source", code_doc.page_content[:200]) not in packed.code_sources
+        ]
+        code_blocks = [f"Code Snippet:\n{code_doc.page_content}" for code_doc in new_code]
+
+        base_tokens = estimate_tokens(log_block) + estimate_tokens(stack_block)
+        code_tokens = sum(estimate_tokens(block) for block in code_blocks)
+        remaining = budget_tokens - packed.tokens
+
+        if base_tokens > remaining:
+            if packed.packed:
+                packed.skipped += 1
+                continue
+            # Always answer about the best document, even if it has to be cut
+            log_block = log_block[:max(0, remaining) * CHARS_PER_TOKEN]
+            stack_block = ""
+            base_tokens = estimate_tokens(log_block)
+
+        logs.append(log_block)
+        if stack_block:
+            stacks.append(stack_block)
+        packed.tokens += base_tokens
+        packed.packed += 1
+
+        if code_blocks and packed.tokens + code_tokens <= budget_tokens:
+            snippets.extend(code_blocks)
+            packed.code_sources.extend(code_doc.metadata.get("source", code_doc.page_content[:200]) for code_doc in new_code)
+            packed.tokens += code_tokens
+
+    packed.context = "\n\n".join(logs)
+    packed.stack_trace = "\n\n".join(stacks)
+    packed.code_context = "\n\n".join(snippets)
+    return packed
@@ -0,0 +1,190 @@
+import calendar
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+# OpenSearch date math: "now", "now-1h", "now/d+16h", "2025-03-20||+1d/d".
+# Unsigned steps such as the "35m11s" in "now/d+16h35m11s" continue the previous sign;
+# OpenSearch itself wants "+16h+35m+11s", but the query constructor examples use the short form.
+_UNIT = r"[yMwdhHms]"
+_OPERATION = re.compile(rf"([+-])?(\d+)({_UNIT})|/({_UNIT})")
+_TIME_ZONE = re.compile(r"^([+-])(\d{2}):?(\d{2})$")
+
+
+def parse_time_zone(time_zone: Optional[str]) -> timezone:
+    """Parse an OpenSearch `time_zone` offset such as '+03:00'. Defaults to UTC."""
+    if not time_zone or time_zone in ("Z", "UTC"):
+        return timezone.utc
+    match = _TIME_ZONE.match(time_zone)
+    if not match:
+        raise ValueError(f"Unsupported time_zone: {time_zone}")
+    sign, hours, minutes = match.groups()
+    offset = timedelta(hours=int(hours), minutes=int(minutes))
+    return timezone(-offset if sign == "-" else offset)
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.month - 1 + months
+    year, month = dt.year + month_index // 12, month_index % 12 + 1
+    day = min(dt.day, calendar.monthrange(year, month)[1])
+    return dt.replace(year=year, month=month, day=day)
+
+
+def _add(dt: datetime, amount: int, unit: str) -> datetime:
+    if unit == "y":
+        return _add_months(dt, 12 * amount)
+    if unit == "M":
+        return _add_months(dt, amount)
+    seconds = {"w": 604800, "d": 86400, "h": 3600, "H": 3600, "m": 60, "s": 1}[unit]
+    return dt + timedelta(seconds=seconds * amount)
+
+
+def _round_down(dt: datetime, unit: str) -> datetime:
+    if unit == "y":
+        return dt.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    if unit == "M":
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if unit == "w":
+        return (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "d":
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit in ("h", "H"):
+        return dt.replace(minute=0, second=0, microsecond=0)
+    if unit == "m":
+        return dt.replace(second=0, microsecond=0)
+    return dt.replace(microsecond=0)
+
+
+def _parse_absolute(value: str, tz: timezone) -> datetime:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=tz)
+
+
+def parse_date_math(expr: str, now: datetime, time_zone: Optional[str] = None, round_up: bool = False) -> datetime:
+    """Resolve an OpenSearch date math expression to a UTC datetime.
+
+    Args:
+        expr: Date math such as "now-1h", "now/d+16h" or "2025-03-20T10:00:00"
+        now: Current time, timezone-aware
+        time_zone: The range's time_zone, used for rounding and dates without offset
+        round_up: Round to the end of the unit, as OpenSearch does for `lte` and `gt`
+
+    Returns:
+        The resolved moment in UTC
+    """
+    tz = parse_time_zone(time_zone)
+    if expr.startswith("now"):
+        dt, operations = now.astimezone(tz), expr[3:]
+    elif "||" in expr:
+        anchor, operations = expr.split("||", 1)
+        dt = _parse_absolute(anchor, tz)
+    else:
+        dt, operations = _parse_absolute(expr, tz), ""
+
+    position = 0
+    last_sign = None
+    for match in _OPERATION.finditer(operations):
+        if match.start() != position:
+            raise ValueError(f"Invalid date math: {expr}")
+        position = match.end()
+        sign, amount, unit, rounding = match.groups()
+        if amount is not None:
+            sign = sign or last_sign
+            if sign is None:
+                raise ValueError(f"Invalid date math: {expr}")
+        last_sign = sign
+        if rounding:
+            dt = _round_down(dt, rounding)
+            if round_up:
+                dt = _add(dt, 1, rounding) - timedelta(milliseconds=1)
+        else:
+            dt = _add(dt, int(amount) if sign == "+" else -int(amount), unit)
+    if position != len(operations):
+        raise ValueError(f"Invalid date math: {expr}")
+
+    return dt.astimezone(timezone.utc)
+
+
+def find_time_range(query: Dict[str, Any], field: str = "time") -> Optional[Dict[str, Any]]:
+    """Find the first `range` clause on `field` anywhere in a query."""
+    if isinstance(query, dict):
+        range_clause = query.get("range")
+        if isinstance(range_clause, dict) and isinstance(range_clause.get(field), dict):
+            return range_clause[field]
+        children = query.values()
+    elif isinstance(query, list):
+        children = query
+    else:
+        return None
+    for child in children:
+        found = find_time_range(child, field)
+        if found is not None:
+            return found
+    return None
+
+
+def resolve_time_range(query: Dict[str, Any], now: datetime, field: str = "time") -> Optional[Tuple[Optional[datetime], datetime]]:
+    """Resolve the query's time range on `field` to concrete UTC bounds.
+
+    Returns:
+        (start, end), where start is None for ranges without a lower bound and
+        end defaults to `now`, or None if the query has no range on `field`
+    """
+    time_range = find_time_range(query, field)
+    if time_range is None:
+        return None
+    time_zone = time_range.get("time_zone")
+
+    start = None
+    if "gte" in time_range:
+        start = parse_date_math(str(time_range["gte"]), now, time_zone)
+    elif "gt" in time_range:
+        start = parse_date_math(str(time_range["gt"]), now, time_zone, round_up=True)
+
+    end = now.astimezone(timezone.utc)
+    if "lte" in time_range:
+        end = parse_date_math(str(time_range["lte"]), now, time_zone, round_up=True)
+    elif "lt" in time_range:
+        end = parse_date_math(str(time_range["lt"]), now, time_zone)
+
+    return start, end
+
+
+def floor_time(dt: datetime, granularity_seconds: int) -> datetime:
+    """Round a datetime down to a multiple of `granularity_seconds` since the epoch."""
+    if granularity_seconds <= 1:
+        return dt.replace(microsecond=0)
+    timestamp = int(dt.timestamp()) // granularity_seconds * granularity_seconds
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def pin_relative_bounds(query: Any, now: datetime, granularity_seconds: int, field: str = "time") -> Any:
+    """Replace the `now` based bounds of range clauses on `field` with absolute UTC times.
+
+    Lower bounds are rounded down and upper bounds up to `granularity_seconds`,
+    so the range never shrinks. OpenSearch does not cache requests that use
+    `now`; pinned queries are identical for every request within a window.
+
+    Returns:
+        A copy of the query
+    """
+    if isinstance(query, list):
+        return [pin_relative_bounds(child, now, granularity_seconds, field) for child in query]
+    if not isinstance(query, dict):
+        return query
+    pinned = {key: pin_relative_bounds(value, now, granularity_seconds, field) for key, value in query.items()}
+    range_clause = query.get("range")
+    if isinstance(range_clause, dict) and isinstance(range_clause.get(field), dict):
+        time_range = dict(range_clause[field])
+        for bound in ("gt", "gte", "lt", "lte"):
+            value = time_range.get(bound)
+            if not isinstance(value, str) or not value.startswith("now"):
+                continue
+            upper = bound in ("lt", "lte")
+            dt = parse_date_math(value, now, time_range.get("time_zone"), round_up=bound in ("gt", "lte"))
+            rounded = floor_time(dt, granularity_seconds)
+            if upper and rounded < dt:
+                rounded += timedelta(seconds=max(1, granularity_seconds))
+            time_range[bound] = rounded.strftime("%Y-%m-%dT%H:%M:%SZ")
+        pinned["range"] = {**pinned["range"], field: time_range}
+    return pinned
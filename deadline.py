@@ -0,0 +1,45 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Awaitable, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a question has used up its time budget."""
+
+
+class Deadline:
+    """Time budget for one question, shared by all of its stages.
+
+    `run` cancels the awaited call when the budget is used up, which aborts
+    the underlying Ollama or OpenSearch request.
+    """
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for an unlimited budget."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """Await `awaitable`, cancelling it once the deadline passes."""
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        if remaining <= 0:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=remaining)
+        except asyncio.TimeoutError:
+            if not self.expired:
+                # A timeout of the call itself, not ours
+                raise
+            raise DeadlineExceeded() from None
@@ -0,0 +1,75 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from rank_bm25 import BM25Okapi
+
+logger = logging.getLogger(__name__)
+
+Example = Tuple[str, Dict[str, Any]]
+
+# Values are reduced to their shape, so "PSV-745559" also matches "PSV-737844"
+_SHAPES = [
+    (re.compile(r"^\d{4}-\d{2}-\d{2}$"), "date"),
+    (re.compile(r"^\d{1,2}:\d{2}(?::\d{2})?$"), "clock"),
+    (re.compile(r"^[a-zа-яё]{2,4}-?\d{4,}(?:-[a-zа-яё]?\d+)*$"), "id"),
+    (re.compile(r"^\d+$"), "number"),
+]
+_TOKEN = re.compile(r"\d{4}-\d{2}-\d{2}|\d{1,2}:\d{2}(?::\d{2})?|[\wа-яё]+(?:-[\wа-яё]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a question into lower-case words, with dates, times and IDs replaced by their shape."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        for pattern, shape in _SHAPES:
+            if pattern.match(token):
+                token = shape
+                break
+        tokens.append(token)
+    return tokens
+
+
+def load_examples(path: str) -> List[Example]:
+    """Load curated examples from a JSON file: [{"question": ..., "query": {...}}, ...]."""
+    with open(path, encoding="utf-8") as f:
+        return [(item["question"], item["query"]) for item in json.load(f)]
+
+
+def format_example(question: str, query: Dict[str, Any]) -> str:
+    return f"User: {question}\nOpenSearch query:\n{json.dumps(query, indent=2)}\n"
+
+
+class BM25ExampleSelector:
+    """Picks the few-shot examples most similar to a question with BM25.
+
+    Examples are tokenized and formatted once, so the corpus can grow to
+    hundreds of pairs while every prompt still carries only `k` of them.
+    """
+    def __init__(self, examples: List[Example], k: int = 4):
+        self.examples = examples
+        self.k = k
+        self._formatted = [format_example(question, query) for question, query in examples]
+        self._bm25 = BM25Okapi([tokenize(question) for question, _ in examples]) if examples else None
+
+    def select(self, question: str, k: Optional[int] = None) -> List[int]:
+        """Return the indexes of the top-k examples, most similar first."""
+        k = self.k if k is None else k
+        if self._bm25 is None or k <= 0 or k >= len(self.examples):
+            return list(range(len(self.examples)))
+        scores = self._bm25.get_scores(tokenize(question))
+        # Ties keep the curated order
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+
+    def format(self, question: str, k: Optional[int] = None) -> str:
+        """Format the selected examples for the prompt.
+
+        A ranked selection is listed least similar first, so the closest
+        example ends up right above the question. All examples keep the
+        curated order.
+        """
+        selected = self.select(question, k)
+        if len(selected) < len(self.examples):
+            selected.reverse()
+        return "\n".join(self._formatted[i] for i in selected)
@@ -0,0 +1,44 @@
+# USAGE:
+# python fingerprint_pipeline.py
+# python fingerprint_pipeline.py --index "bus-prod-info-2025.04.*" --backfill
+#
+# Installs the ingest pipeline that stores the message template of every log
+# entry in the fingerprint field (OPENSEARCH_FINGERPRINT_FIELD), maps the field
+# as a keyword and makes the pipeline the default one of the matching indices.
+# Indices created later need `index.default_pipeline` in their index template.
+# With --backfill, entries indexed before are updated in place.
+import argparse
+
+from config import settings
+from log_clusterer import fingerprint_pipeline
+from opensearch_clients import clients
+
+
+def main(pipeline_id: str, index: str, max_length: int, backfill: bool):
+    client = clients.get()
+    field = settings.opensearch_fingerprint_field
+
+    client.ingest.put_pipeline(id=pipeline_id, body=fingerprint_pipeline(target_field=field, max_length=max_length))
+    print(f"Pipeline {pipeline_id} writes {field}")
+
+    client.indices.put_mapping(index=index, body={"properties": {field: {"type": "keyword", "ignore_above": max_length}}})
+    client.indices.put_settings(index=index, body={"index": {"default_pipeline": pipeline_id}})
+    print(f"Mapped {field} as a keyword and set the default pipeline of {index}")
+
+    if backfill:
+        task = client.update_by_query(
+            index=index,
+            body={"query": {"bool": {"must_not": {"exists": {"field": field}}}}},
+            params={"pipeline": pipeline_id, "conflicts": "proceed", "wait_for_completion": "false"},
+        )
+        print(f"Backfill started, task {task['task']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Install the log message fingerprint ingest pipeline")
+    parser.add_argument("--pipeline", default="log-fingerprint")
+    parser.add_argument("--index", default=settings.opensearch_index)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--backfill", action="store_true")
+    args = parser.parse_args()
+    main(args.pipeline, args.index, args.max_length, args.backfill)
@@ -0,0 +1,142 @@
+import fnmatch
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import settings
+from date_math import parse_time_zone, resolve_time_range
+from ttl_cache import TTLCache
+
+# The day the index list was read and the open indices it contained
+Listing = Tuple[date, Set[str]]
+
+# After a failed listing, searches use the wildcard this long before the list is read again
+LISTING_RETRY_SECONDS = 30
+
+
+def find_terms(query: Any, field: str) -> List[str]:
+    """Collect the values that term and terms clauses require of `field`.
+
+    Only filter and must clauses count; must_not and should do not restrict the field.
+    """
+    values: List[str] = []
+    if isinstance(query, list):
+        for clause in query:
+            values.extend(value for value in find_terms(clause, field) if value not in values)
+        return values
+    if not isinstance(query, dict):
+        return values
+    if isinstance(query.get("bool"), dict):
+        for section in ("filter", "must"):
+            values.extend(value for value in find_terms(query["bool"].get(section, []), field) if value not in values)
+        return values
+    for clause_type in ("term", "terms"):
+        body = query.get(clause_type)
+        if isinstance(body, dict) and field in body:
+            value = body[field]
+            if isinstance(value, dict):
+                value = value.get("value")
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, str) and item not in values:
+                    values.append(item)
+    return values
+
+
+class IndexResolver:
+    """Maps a query to the daily indices that can hold its hits, instead of a wildcard over all of them.
+
+    `pattern` names the daily indices, e.g. "bus-{ns}-info-{date}", with
+    `{date}` formatted by `date_format` in `time_zone`. The query's ns filter
+    picks the index families and its time range picks the days; without an
+    ns filter, only the families matching `base_pattern` (the configured
+    index pattern) are searched. Names are checked against the list of open
+    indices, which is cached for `ttl_seconds`; days after the list was read
+    are matched by a wildcard, since their index may have been created
+    since. When the list shows that no index holds any day of the range,
+    `resolve` returns an empty string.
+    """
+    def __init__(
+        self,
+        pattern: str = settings.opensearch_daily_index_pattern,
+        date_format: str = settings.opensearch_index_date_format,
+        time_zone: str = settings.opensearch_index_time_zone,
+        max_indices: int = settings.opensearch_max_resolved_indices,
+        ttl_seconds: float = settings.opensearch_index_list_ttl_seconds,
+        base_pattern: str = settings.opensearch_index
+    ):
+        self.pattern = pattern
+        self.base_patterns = [part.strip() for part in base_pattern.split(",") if part.strip()]
+        self.date_format = date_format
+        self.time_zone = parse_time_zone(time_zone)
+        self.max_indices = max_indices
+        self._listing = TTLCache(max_entries=1, ttl_seconds=ttl_seconds)
+        self._listing_failure = TTLCache(max_entries=1, ttl_seconds=LISTING_RETRY_SECONDS)
+
+    def listing_pattern(self) -> str:
+        """The pattern to list every daily index with."""
+        return self.pattern.format(ns="*", date="*")
+
+    def in_base_pattern(self, name: str) -> bool:
+        """Whether an index name matches the configured index pattern."""
+        return any(fnmatch.fnmatchcase(name, base) for base in self.base_patterns)
+
+    def known_indices(self) -> Optional[Listing]:
+        """The cached index list, or None when it has to be read again."""
+        return self._listing.get("indices")
+
+    def listing_failed(self) -> bool:
+        """Whether reading the index list failed recently, so it should not be retried yet."""
+        return self._listing_failure.get("failed") is not None
+
+    def remember_failure(self) -> None:
+        """Skip reading the index list for LISTING_RETRY_SECONDS."""
+        self._listing_failure.set("failed", True)
+
+    def remember_indices(self, rows: Iterable[Dict[str, Any]], now: Optional[datetime] = None) -> Listing:
+        """Cache the open indices of a `cat indices` response."""
+        now = now or datetime.now(timezone.utc)
+        listing = (now.astimezone(self.time_zone).date(), {row["index"] for row in rows if row.get("status", "open") == "open"})
+        self._listing.set("indices", listing)
+        return listing
+
+    def resolve(self, query: Dict[str, Any], listing: Optional[Listing], now: Optional[datetime] = None) -> Optional[str]:
+        """Return the comma separated indices to search for a query.
+
+        Returns:
+            The index names, an empty string when no index holds hits of the
+            query, or None to search the configured index pattern
+        """
+        now = now or datetime.now(timezone.utc)
+        families = find_terms(query, "ns")
+        fallback = ",".join(self.pattern.format(ns=ns, date="*") for ns in families) or None
+
+        try:
+            time_range = resolve_time_range(query, now)
+        except ValueError:
+            time_range = None
+        if listing is None or time_range is None or time_range[0] is None:
+            return fallback
+
+        first, last = (bound.astimezone(self.time_zone).date() for bound in time_range)
+        days = (last - first).days + 1
+        if days <= 0:
+            return ""
+        if days > self.max_indices:
+            return fallback
+
+        listed_on, existing = listing
+        names: List[str] = []
+        for offset in range(days):
+            day = first + timedelta(days=offset)
+            for ns in families or ["*"]:
+                name = self.pattern.format(ns=ns, date=day.strftime(self.date_format))
+                matches = sorted(fnmatch.filter(existing, name))
+                if not families:
+                    matches = [match for match in matches if self.in_base_pattern(match)]
+                if matches:
+                    names.extend(match for match in matches if match not in names)
+                elif day >= listed_on:
+                    if not families:
+                        # A wildcard over every family would reach past the configured pattern
+                        return fallback
+                    names.append(name if "*" in name else f"{name}*")
+        return ",".join(names)
@@ -0,0 +1,115 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from date_math import resolve_time_range
+from opensearch_fast_path import TIME_ZONE
+
+_COUNT = re.compile(r"\b(?:how many|how often|count|number of|statistics|stats)\b", re.IGNORECASE)
+_TOP = re.compile(r"\b(?:which|top|most)\s+(service|svc|namespace|level)s?\b", re.IGNORECASE)
+_GROUP = re.compile(
+    r"\b(?:by|per|for each|each|across)\s+(service|svc|level|namespace|ns|environment|env)s?\b", re.IGNORECASE
+)
+_INTERVAL = re.compile(r"\b(?:by|per|each|every)\s+(minute|hour|day|week|month)\b|\b(hourly|daily|weekly|monthly)\b", re.IGNORECASE)
+_TREND = re.compile(r"\b(?:trend|trends|over time|histogram|timeline|dynamics)\b", re.IGNORECASE)
+
+_GROUP_FIELDS = {
+    "service": "svc", "svc": "svc", "level": "level",
+    "namespace": "ns", "ns": "ns", "environment": "ns", "env": "ns",
+}
+_INTERVALS = {
+    "minute": "1m", "hour": "1h", "day": "1d", "week": "1w", "month": "1M",
+    "hourly": "1h", "daily": "1d", "weekly": "1w", "monthly": "1M",
+}
+
+
+@dataclass
+class AggregationRequest:
+    """What to count: totals, grouped by keyword fields and/or bucketed over time.
+
+    `interval` is a calendar interval such as "1h", "auto" to pick one from
+    the time range of the query, or None for no histogram.
+    """
+    group_by: List[str] = field(default_factory=list)
+    interval: Optional[str] = None
+
+
+def detect_aggregation(question: str) -> Optional[AggregationRequest]:
+    """Recognize counting and trend questions, e.g. "How many errors in prod today, by service?"."""
+    group_by: List[str] = []
+    for match in list(_GROUP.finditer(question)) + list(_TOP.finditer(question)):
+        name = _GROUP_FIELDS[match.group(1).lower()]
+        if name not in group_by:
+            group_by.append(name)
+
+    interval = None
+    match = _INTERVAL.search(question)
+    if match:
+        interval = _INTERVALS[(match.group(1) or match.group(2)).lower()]
+    elif _TREND.search(question):
+        interval = "auto"
+
+    if not (_COUNT.search(question) or group_by or interval):
+        return None
+    return AggregationRequest(group_by=group_by, interval=interval)
+
+
+def auto_interval(opensearch_query: Dict[str, Any], now: Optional[datetime] = None) -> str:
+    """Pick a histogram interval that gives a readable number of buckets for the query's time range."""
+    now = now or datetime.now(timezone.utc)
+    try:
+        time_range = resolve_time_range(opensearch_query, now)
+    except ValueError:
+        time_range = None
+    if not time_range or time_range[0] is None:
+        return "1d"
+    span = (time_range[1] - time_range[0]).total_seconds()
+    if span <= 2 * 3600:
+        return "1m" if span <= 1800 else "5m"
+    if span <= 2 * 86400:
+        return "1h"
+    if span <= 62 * 86400:
+        return "1d"
+    return "1w"
+
+
+def build_aggregations(request: AggregationRequest, opensearch_query: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the `aggs` section of a size 0 search."""
+    aggs: Dict[str, Any] = {}
+    for name in request.group_by:
+        aggs[f"by_{name}"] = {"terms": {"field": name, "size": settings.aggregation_terms_size}}
+    if request.interval:
+        interval = auto_interval(opensearch_query) if request.interval == "auto" else request.interval
+        # Calendar intervals follow the time zone but allow a single unit only; multiples such as 5m are fixed
+        key = "calendar_interval" if interval.startswith("1") else "fixed_interval"
+        aggs["over_time"] = {
+            "date_histogram": {
+                "field": "time",
+                key: interval,
+                "time_zone": TIME_ZONE,
+                "min_doc_count": 1,
+                "format": "yyyy-MM-dd HH:mm",
+            }
+        }
+    return aggs
+
+
+def format_aggregation(response: Dict[str, Any]) -> str:
+    """Turn an aggregation response into a compact text summary for the answerer."""
+    total = response["hits"]["total"]
+    total = total["value"] if isinstance(total, dict) else total
+    lines = [f"Total matching log entries: {total}"]
+    for name, result in response.get("aggregations", {}).items():
+        if name.startswith("by_"):
+            lines.append(f"\nCount by {name[3:]}:")
+            for bucket in result["buckets"]:
+                lines.append(f"- {bucket['key']}: {bucket['doc_count']}")
+            if result.get("sum_other_doc_count"):
+                lines.append(f"- (other): {result['sum_other_doc_count']}")
+        elif name == "over_time":
+            lines.append(f"\nCount over time ({TIME_ZONE}):")
+            for bucket in result["buckets"]:
+                lines.append(f"- {bucket['key_as_string']}: {bucket['doc_count']}")
+    return "\n".join(lines)
@@ -0,0 +1,147 @@
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from config import settings
+
+# Variable parts of log messages, replaced by placeholders to get the message template.
+# Order matters: more specific patterns must run before the generic number mask.
+MASKS: List[Tuple[str, str]] = [
+    ("<UUID>", r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),
+    ("<TIME>", r"\b(?:\d{4}-\d{2}-\d{2}|\d{2}\.\d{2}\.\d{4})[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"),
+    ("<IP>", r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    ("<HEX>", r"\b[0-9a-fA-F]{24}\b"),
+    # Kubernetes pod names and moleculer node IDs, e.g. esb-clients-crm-generator-566d9ff8c-pw6zv-19
+    ("<HOST>", r"\b[a-z][a-z0-9]*(?:-[a-z0-9]+)*-(?=[a-z]*\d)[a-z0-9]{8,10}-[a-z0-9]{5}(?:-\d+)?\b"),
+    # Business IDs, e.g. PSV-745559, NM0098877, PSV-737844-К0015742
+    ("<ID>", r"\b[A-ZА-ЯЁ]{2,4}-?\d{4,}(?:-[A-ZА-ЯЁ]?\d+)*\b"),
+    ("<NUM>", r"\b\d+\b"),
+]
+
+# Placeholders whose values identify affected entities and are listed in the answer
+ID_PLACEHOLDERS = {"<UUID>", "<HEX>", "<ID>"}
+
+_COMPILED_MASKS = [(placeholder, re.compile(pattern)) for placeholder, pattern in MASKS]
+
+
+def mask_message(msg: str) -> Tuple[str, Set[str]]:
+    """Replace variable tokens in a log message with placeholders.
+
+    Returns:
+        The message template and the set of masked identifier values
+    """
+    ids: Set[str] = set()
+    for placeholder, pattern in _COMPILED_MASKS:
+        if placeholder in ID_PLACEHOLDERS:
+            ids.update(pattern.findall(msg))
+        msg = pattern.sub(placeholder, msg)
+    return msg, ids
+
+
+def fingerprint_pipeline(source_field: str = "msg", target_field: str = "msg_template", max_length: int = 512) -> Dict[str, Any]:
+    """Build an ingest pipeline that stores the message template of every log entry in a keyword field.
+
+    It applies the same masks as `mask_message`, so the server-side
+    fingerprint and the local clustering agree. The template is cut to
+    `max_length` characters to stay below the keyword `ignore_above` limit.
+    """
+    processors: List[Dict[str, Any]] = [
+        {"set": {"field": target_field, "copy_from": source_field, "ignore_empty_value": True}},
+    ]
+    for placeholder, pattern in MASKS:
+        processors.append(
+            {"gsub": {"field": target_field, "pattern": pattern, "replacement": placeholder, "ignore_missing": True}}
+        )
+    processors.append({
+        "script": {
+            "lang": "painless",
+            "source": (
+                f"if (ctx['{target_field}'] != null && ctx['{target_field}'].length() > params.max_length) "
+                f"{{ ctx['{target_field}'] = ctx['{target_field}'].substring(0, params.max_length); }}"
+            ),
+            "params": {"max_length": max_length},
+        }
+    })
+    return {"description": f"Message template of {source_field} for collapsing repeated log entries", "processors": processors}
+
+
+def _merge_counts(metadata: Dict[str, Any], other: Dict[str, Any]) -> None:
+    """Add the occurrence count (1 unless collapsed on the server) and time span of `other` to `metadata`."""
+    metadata["occurrence_count"] = metadata.get("occurrence_count", 1) + other.get("occurrence_count", 1)
+    firsts = [value for value in (metadata.get("first_seen"), other.get("first_seen")) if value]
+    lasts = [value for value in (metadata.get("last_seen"), other.get("last_seen")) if value]
+    if firsts:
+        metadata["first_seen"] = min(firsts)
+    if lasts:
+        metadata["last_seen"] = max(lasts)
+
+
+class DocumentClusterer:
+    """Groups documents by message template as they arrive.
+
+    The first document of each group becomes its representative; later
+    documents of the group only add an occurrence to it. At most
+    `max_occurrences` occurrences (0 for all) are listed per group, the
+    rest only raise its `occurrence_count`.
+    """
+    def __init__(self, max_occurrences: int = settings.log_cluster_max_occurrences):
+        self.max_occurrences = max_occurrences
+        self.clusters: Dict[Tuple, Document] = {}
+
+    def add(self, doc: Document) -> Optional[Document]:
+        """Add a document; returns its representative if it starts a new group, otherwise None."""
+        template, ids = mask_message(doc.page_content)
+        key = (doc.metadata.get("level"), doc.metadata.get("ns"), doc.metadata.get("svc"), template)
+        occurrence = {"time": doc.metadata.get("time"), "ids": sorted(ids)}
+
+        representative = self.clusters.get(key)
+        if representative is None:
+            representative = self.clusters[key] = Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "template": template, "occurrences": [occurrence]}
+            )
+            return representative
+        occurrences = representative.metadata["occurrences"]
+        if not self.max_occurrences or len(occurrences) < self.max_occurrences:
+            occurrences.append(occurrence)
+        _merge_counts(representative.metadata, doc.metadata)
+        return None
+
+
+def cluster_documents(docs: List[Document]) -> List[Document]:
+    """Group documents whose messages share a template.
+
+    Each group is represented by its first (best scored) document. The
+    representative gets the template, the number of occurrences and, per
+    occurrence, its time and affected IDs in its metadata.
+    """
+    clusterer = DocumentClusterer()
+    for doc in docs:
+        clusterer.add(doc)
+    return list(clusterer.clusters.values())
+
+
+def format_occurrences(doc: Document) -> str:
+    """Describe every occurrence of a clustered document for the answer context.
+
+    Documents collapsed on the cluster carry the total count and time span
+    of their message in `occurrence_count`, `first_seen` and `last_seen`.
+    """
+    occurrences = doc.metadata.get("occurrences", [])
+    total = doc.metadata.get("occurrence_count", len(occurrences))
+    if total <= 1:
+        return ""
+    summary = f"This log entry occurred {total} times"
+    if doc.metadata.get("first_seen"):
+        summary += f" from {doc.metadata['first_seen']} to {doc.metadata['last_seen']}"
+    if doc.metadata.get("template"):
+        summary += f" (variable parts masked: {doc.metadata['template']})"
+    lines = [f"{summary}."]
+    if len(occurrences) <= 1:
+        return lines[0]
+    lines.append(f"Occurrences ({len(occurrences)} of {total} listed):" if len(occurrences) < total else "Occurrences:")
+    for occurrence in occurrences:
+        ids = ", ".join(occurrence["ids"]) or "no IDs"
+        lines.append(f"- {occurrence['time']}: {ids}")
+    return "\n".join(lines)
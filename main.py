@@ -1,12 +1,15 @@
 import asyncio
 import logging
+import multiprocessing
 from aiogram import Bot, Dispatcher
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandStart
 from aiogram.types import Message
 from langchain_core.messages import HumanMessage
 
 from config import settings
 from workflow import ChatChain
+from scheduler import RequestScheduler
+from opensearch_clients import clients
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +24,9 @@ class TelegramBot:
         self.bot = Bot(token=settings.telegram_bot_token)
         self.dp = Dispatcher()
         self.chat_chain = ChatChain(self.bot)
+        self.scheduler = RequestScheduler(self.bot, self.chat_chain)
+        # Kept so the background warm-up task is not garbage collected
+        self._warmup = None
         
         # Register handlers
         self.register_handlers()
@@ -28,17 +34,34 @@ class TelegramBot:
     def register_handlers(self):
         """Register message handlers."""
         self.dp.message.register(self.cmd_start, CommandStart())
+        self.dp.message.register(self.cmd_stats, Command("stats"))
         self.dp.message.register(self.handle_message)
     
     async def cmd_start(self, message: Message):
         """Handle /start command."""
         await message.answer("Hello! Send me any message and I'll help you!")
     
+    async def cmd_stats(self, message: Message):
+        """Handle /stats command: connection pool and cache usage of this process."""
+        lines = ["OpenSearch pools:"]
+        for name, stats in clients.stats().items():
+            lines.append(
+                f"  {name}: {stats['in_flight']}/{stats['pool_size']} in flight, peak {stats['peak']}, "
+                f"{stats['requests']} requests, {stats['failures']} failed"
+            )
+        lines.append(f"Translations: {self.chat_chain.opensearch_retriever.translation_stats()}")
+        if self.chat_chain.response_cache is not None:
+            lines.append(f"Response cache: {self.chat_chain.response_cache.stats()}")
+        result_cache_stats = self.chat_chain.opensearch_retriever.result_cache_stats()
+        if result_cache_stats is not None:
+            lines.append(f"Search result cache: {result_cache_stats}")
+        await message.answer("\n".join(lines))
+
     async def handle_message(self, message: Message):
         """Handle incoming messages."""
         try:
-            # Process message through chat chain
-            await self.chat_chain.process_message(
+            # Queue the message; the scheduler runs it through the chat chain
+            await self.scheduler.submit(
                 telegram_chat_id=message.chat.id,
                 question=message.text
             )
@@ -47,8 +70,31 @@ class TelegramBot:
             logger.error(f"Error processing message: {str(e)}")
             await message.answer(f"Sorry, I encountered an error: {str(e)}")
     
+    def warm_up(self) -> None:
+        """Warm the LLM prompts up in the background while the bot starts."""
+        if settings.prompt_warmup_enabled:
+            self._warmup = asyncio.create_task(self.chat_chain.awarmup())
+
+    async def consume(self, updates: multiprocessing.Queue):
+        """Handle updates forwarded by the webhook server until it sends None."""
+        loop = asyncio.get_running_loop()
+        self.warm_up()
+        try:
+            logger.info("Bot worker started")
+            while True:
+                update = await loop.run_in_executor(None, updates.get)
+                if update is None:
+                    break
+                await self.dp.feed_raw_update(self.bot, update)
+        finally:
+            await self.scheduler.close()
+            await clients.close()
+            await self.bot.session.close()
+            logger.info("Bot worker stopped")
+
     async def start(self):
         """Start the bot."""
+        self.warm_up()
         try:
             logger.info("Starting bot polling...")
             await self.dp.start_polling(self.bot)
@@ -56,9 +102,16 @@ class TelegramBot:
             logger.error(f"Bot polling failed: {str(e)}")
             raise
         finally:
+            await self.scheduler.close()
+            await clients.close()
             logger.info("Bot stopped")
 
 async def main():
+    if settings.telegram_mode == "webhook":
+        from webhook import WebhookServer
+        await WebhookServer().run()
+        return
+
     bot = TelegramBot()
     await bot.start()
 
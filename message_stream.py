@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import settings
+from progress_reporter import TELEGRAM_MESSAGE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramMessageStream:
+    """Streams generated text into Telegram messages.
+
+    The current message is edited as text arrives, but only when at least
+    `min_interval` seconds and `min_chars` new characters have accumulated.
+    Text that does not fit into one message rolls over into a new one.
+    """
+    def __init__(
+        self,
+        bot: Bot,
+        telegram_chat_id: int,
+        header: str = "",
+        min_interval: float = settings.answer_stream_edit_interval,
+        min_chars: int = settings.answer_stream_min_chars
+    ):
+        self.bot = bot
+        self.telegram_chat_id = telegram_chat_id
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self._text = header
+        self._message_id: Optional[int] = None
+        self._sent_text = ""
+        self._next_edit = 0.0
+
+    async def write(self, chunk: str) -> None:
+        """Append a chunk and update the message if the throttle allows it."""
+        self._text += chunk
+        while len(self._text) > TELEGRAM_MESSAGE_LIMIT:
+            await self._roll_over()
+
+        if time.monotonic() >= self._next_edit and len(self._text) - len(self._sent_text) >= self.min_chars:
+            await self._send()
+
+    async def finish(self) -> None:
+        """Write out whatever is still pending."""
+        await self._send(force=True)
+
+    async def _roll_over(self) -> None:
+        # Split on a line break when there is one reasonably close to the limit
+        split = self._text.rfind("\n", 0, TELEGRAM_MESSAGE_LIMIT)
+        if split < TELEGRAM_MESSAGE_LIMIT // 2:
+            split = TELEGRAM_MESSAGE_LIMIT
+        remainder = self._text[split:].lstrip("\n")
+        self._text = self._text[:split]
+        await self._send(force=True)
+
+        # Continue in a fresh message
+        self._text = remainder
+        self._message_id = None
+        self._sent_text = ""
+
+    async def _send(self, force: bool = False) -> None:
+        text = self._text
+        if not text.strip() or text == self._sent_text:
+            return
+        try:
+            if self._message_id is None:
+                msg = await self.bot.send_message(chat_id=self.telegram_chat_id, text=text)
+                self._message_id = msg.message_id
+            else:
+                await self.bot.edit_message_text(
+                    chat_id=self.telegram_chat_id,
+                    message_id=self._message_id,
+                    text=text
+                )
+            self._sent_text = text
+            self._next_edit = time.monotonic() + self.min_interval
+        except TelegramRetryAfter as e:
+            logger.warning(f"Answer streaming throttled by Telegram for {e.retry_after}s")
+            self._next_edit = time.monotonic() + e.retry_after
+            if force:
+                # This is the last write to the message, its text must not be lost
+                await asyncio.sleep(e.retry_after)
+                await self._send(force=True)
+        except TelegramBadRequest as e:
+            logger.warning(f"Answer streaming update rejected: {str(e)}")
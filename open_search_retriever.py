@@ -1,14 +1,46 @@
-from typing import List
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from pydantic import Field, PrivateAttr
 from opensearch_query_constructor import OpenSearchQueryConstructor
+from opensearch_query_validator import InvalidQueryError
 from opensearchpy import OpenSearch, AsyncOpenSearch
+from opensearch_clients import clients
+from index_resolver import IndexResolver, Listing
+from date_math import pin_relative_bounds
+from search_result_cache import SearchResultCache, fingerprint
+from log_aggregations import AggregationRequest, build_aggregations, detect_aggregation, format_aggregation
 from pprint import pformat
 from config import settings
 
 
+# The only fields documents are built from; everything else in _source is never fetched
+SOURCE_FIELDS = ("msg", "level", "ns", "svc", "time")
+
+# Cuts the stack trace section out of msg on the cluster, so the full message is not transferred
+STACK_TRACE_SCRIPT = """
+def msg = params['_source']['msg'];
+if (msg == null) { return ''; }
+int start = msg.indexOf('stack:');
+if (start < 0) { return ''; }
+return msg.substring(start, (int) Math.min(msg.length(), start + params.max_chars)).trim();
+"""
+
+
+def _canonical(query: Any) -> Any:
+    """The query with clause lists in a fixed order, to compare queries regardless of clause order."""
+    if isinstance(query, dict):
+        return {key: _canonical(value) for key, value in query.items()}
+    if isinstance(query, list):
+        return sorted((_canonical(item) for item in query), key=lambda item: json.dumps(item, sort_keys=True, default=str))
+    return query
+
+
 class OpenSearchRetriever(BaseRetriever):
     """A custom retriever that searches documents in OpenSearch with query translation."""
 
@@ -26,29 +58,31 @@ class OpenSearchRetriever(BaseRetriever):
     _client: OpenSearch = PrivateAttr()
     _aclient: AsyncOpenSearch = PrivateAttr()
     _query_constructor: OpenSearchQueryConstructor = PrivateAttr()
+    # Which translator produced each query: "cache", "rules" or "llm"
+    _translation_hits: Counter = PrivateAttr(default_factory=Counter)
+    _index_resolver: Optional[IndexResolver] = PrivateAttr(default=None)
+    _result_cache: Optional[SearchResultCache] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        # Initialize OpenSearch client
-        self._client = OpenSearch(
-            hosts=[{'host': self.host, 'port': self.port}],
-            http_auth=(self.username, self.password) if self.username else None,
+        # Clients come from the process-wide registry, so all retrievers share their connection pools
+        connection = dict(
+            host=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
             use_ssl=self.use_ssl,
-            verify_certs=self.verify_certs,
-            ssl_show_warn=False
-        )
-
-        # Initialize AsyncOpenSearch client
-        self._aclient = AsyncOpenSearch(
-            hosts=[{'host': self.host, 'port': self.port}],
-            http_auth=(self.username, self.password) if self.username else None,
-            use_ssl=self.use_ssl,
-            verify_certs=self.verify_certs,
-            ssl_show_warn=False
+            verify_certs=self.verify_certs
         )
+        self._client = clients.get(**connection)
+        self._aclient = clients.aget(**connection)
         
         self._query_constructor = OpenSearchQueryConstructor()
+        if settings.opensearch_daily_index_pattern:
+            self._index_resolver = IndexResolver()
+        if settings.opensearch_result_cache_enabled:
+            self._result_cache = SearchResultCache()
 
     def _get_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
@@ -63,41 +97,30 @@ class OpenSearchRetriever(BaseRetriever):
             List of found documents
         """
         # Use OpenSearchQueryConstructor to build the query
-        opensearch_query = self._query_constructor.construct_query(query)
+        opensearch_query = self._query_constructor.construct_valid_query(query)
         print(f"OpenSearch query: {pformat(opensearch_query)}")
         print("--------------------------------")
         
         # Execute search
-        result = self._client.search(
-            index=self.index,
-            body={
-                "query": opensearch_query,
-                "size": self.opensearch_query_size,
-            }
-        )
-
-        print(f"--- RETRIEVED {len(result['hits']['hits'])} documents")
-        
-        # Convert OpenSearch results to Documents
-        docs = []
-        for hit in result["hits"]["hits"]:
-            source = hit["_source"]
-            docs.append(
-                Document(
-                    page_content=source.get("msg", ""),
-                    metadata={
-                        "level": source.get("level"),
-                        "ns": source.get("ns"),
-                        "svc": source.get("svc"),
-                        "time": source.get("time"),
-                        "score": hit["_score"]
-                    }
-                )
-            )
-        
+        opensearch_query = self._pin_time(opensearch_query)
+        index = self._resolve_index(opensearch_query)
+        if not index:
+            return []
+        body = self._search_body(opensearch_query)
+        cache_key, docs = self._cached_documents(index, body)
+        if docs is not None:
+            return docs
+        result = self._client.search(index=index, body=body, params=self._search_params(body))
+        docs = self._to_documents(result)
+        if "collapse" in body:
+            stats_body = self._occurrence_stats_body(opensearch_query, docs)
+            if stats_body is not None:
+                stats = self._client.search(index=index, body=stats_body, params=self._search_params(stats_body))
+                self._add_occurrence_stats(docs, stats)
+        if cache_key is not None:
+            self._result_cache.set(cache_key, opensearch_query, docs)
         return docs
 
-
     async def _aget_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
     ) -> List[Document]:
@@ -110,49 +133,474 @@ class OpenSearchRetriever(BaseRetriever):
         Returns:
             List of found documents
         """
-        # Use OpenSearchQueryConstructor to build the query
-        opensearch_query = await self._query_constructor.aconstruct_query(query)
+        opensearch_query, search = await self.atranslate_and_search(query)
+        return await self.asearch(opensearch_query, search)
+
+    async def awarmup(self) -> float:
+        """Prefill the query constructor prompt; returns the time taken."""
+        return await self._query_constructor.awarmup()
+
+    async def atranslate(self, query: str) -> Dict[str, Any]:
+        """Translate a natural language query into an OpenSearch query.
+        
+        Args:
+            query: The natural language query
+            
+        Returns:
+            The OpenSearch query
+        """
+        opensearch_query, search = await self.atranslate_and_search(query)
+        if search is not None:
+            search.cancel()
+        return opensearch_query
+
+    async def atranslate_and_search(self, query: str) -> Tuple[Dict[str, Any], Optional[asyncio.Task]]:
+        """Translate a natural language query, possibly starting its search on the way.
+        
+        The translation cache and a confident rule-based parser answer at
+        once. Otherwise the LLM translates while the search already runs with
+        the unsure parser's query; that search is returned when the LLM comes
+        up with the same query and cancelled when it does not.
+        
+        Args:
+            query: The natural language query
+            
+        Returns:
+            The OpenSearch query and the search already running for it, if any.
+            The caller owns the search: pass it to `asearch` or cancel it.
+        """
+        search = None
+        if settings.opensearch_speculative_translation:
+            opensearch_query, search = await self._race_translators(query)
+        else:
+            opensearch_query = await self._query_constructor.aconstruct_valid_query(query)
         print(f"OpenSearch query: {pformat(opensearch_query)}")
         print("--------------------------------")
+        return opensearch_query, search
+
+    async def _race_translators(self, query: str) -> Tuple[Dict[str, Any], Optional[asyncio.Task]]:
+        constructor = self._query_constructor
+        for name, translate in (("cache", constructor.cached_query), ("rules", constructor.rule_based_query)):
+            try:
+                opensearch_query = translate(query)
+            except InvalidQueryError as e:
+                print(f"--- No valid query from {name}: {e}")
+                continue
+            if opensearch_query is not None:
+                return self._translated_by(name, opensearch_query), None
+
+        # Search with the parser's guess while the LLM works; questions answered without a search get no guess
+        guess = None
+        if not settings.opensearch_streaming_enabled and not (
+            settings.aggregation_mode_enabled and self.aggregation_request(query) is not None
+        ):
+            guess = constructor.rule_based_guess(query)
+        speculative = None
+        if guess is not None:
+            speculative = asyncio.create_task(self.asearch(guess))
+            # A search that fails after being discarded should not be reported as unhandled
+            speculative.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+        try:
+            opensearch_query = await constructor.allm_query(query)
+        except BaseException:
+            if speculative is not None:
+                speculative.cancel()
+            raise
+
+        if speculative is not None:
+            if _canonical(opensearch_query) == _canonical(guess):
+                return self._translated_by("rules-speculative", opensearch_query), speculative
+            speculative.cancel()
+            print("--- The LLM query differs from the rule-based guess, discarding its search")
+        return self._translated_by("llm", opensearch_query), None
+
+    def _translated_by(self, name: str, opensearch_query: Dict[str, Any]) -> Dict[str, Any]:
+        self._translation_hits[name] += 1
+        print(f"--- Translated by {name}, hits so far: {dict(self._translation_hits)}")
+        return opensearch_query
+
+    def translation_stats(self) -> Dict[str, int]:
+        """How many queries each translator produced."""
+        return dict(self._translation_hits)
+
+    async def asearch(self, opensearch_query: Dict[str, Any], search: Optional[asyncio.Task] = None) -> List[Document]:
+        """Run an already translated query against OpenSearch.
         
+        Args:
+            opensearch_query: The OpenSearch query
+            search: The search `atranslate_and_search` already started for this query
+            
+        Returns:
+            List of found documents
+        """
+        if search is not None:
+            print("--- Using the search started during translation")
+            return await search
+
         # Execute search
-        result = await self._aclient.search(
-            index=self.index,
-            body={
-                "query": opensearch_query,
-                "size": self.opensearch_query_size,
+        opensearch_query = self._pin_time(opensearch_query)
+        index = await self._aresolve_index(opensearch_query)
+        if not index:
+            return []
+        body = self._search_body(opensearch_query)
+        cache_key, docs = self._cached_documents(index, body)
+        if docs is not None:
+            return docs
+        result = await self._aclient.search(index=index, body=body, params=self._search_params(body))
+        docs = self._to_documents(result)
+        if "collapse" in body:
+            stats_body = self._occurrence_stats_body(opensearch_query, docs)
+            if stats_body is not None:
+                stats = await self._aclient.search(index=index, body=stats_body, params=self._search_params(stats_body))
+                self._add_occurrence_stats(docs, stats)
+        if cache_key is not None:
+            self._result_cache.set(cache_key, opensearch_query, docs)
+        return docs
+
+    def aggregation_request(self, query: str) -> Optional[AggregationRequest]:
+        """Detect a counting or trend question that is better answered by an aggregation.
+        
+        Args:
+            query: The natural language query
+            
+        Returns:
+            What to aggregate, or None for a regular search
+        """
+        return detect_aggregation(query)
+
+    async def aaggregate(self, opensearch_query: Dict[str, Any], request: AggregationRequest) -> str:
+        """Count the matching log entries on the cluster instead of fetching them.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            request: What to group and bucket the counts by
+            
+        Returns:
+            A compact text summary of the counts
+        """
+        opensearch_query = self._pin_time(opensearch_query)
+        body = {
+            "query": opensearch_query,
+            "size": 0,
+            "track_total_hits": True,
+            "aggs": build_aggregations(request, opensearch_query),
+        }
+        index = await self._aresolve_index(opensearch_query)
+        if index:
+            result = await self._aclient.search(index=index, body=body, params=self._search_params(body))
+        else:
+            result = {"hits": {"total": {"value": 0}}}
+        summary = format_aggregation(result)
+        print(f"--- AGGREGATION: {summary} END ---")
+        return summary
+
+    async def astream_documents(
+        self,
+        opensearch_query: Dict[str, Any],
+        page_size: int = settings.opensearch_page_size,
+        max_documents: int = settings.opensearch_stream_max_documents
+    ) -> AsyncIterator[List[Document]]:
+        """Page through all hits of a query in time order, yielding one page at a time.
+        
+        Pages are read from a point in time with search_after, so the results
+        stay consistent while new logs are indexed and only one page is held
+        in memory at a time. The point in time is deleted when the generator
+        is closed.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            page_size: Hits per page
+            max_documents: Stop after this many hits (0 for no limit)
+            
+        Yields:
+            Lists of found documents
+        """
+        keep_alive = settings.opensearch_pit_keep_alive
+        opensearch_query = self._pin_time(opensearch_query)
+        index = await self._aresolve_index(opensearch_query)
+        if not index:
+            return
+        pit = await self._aclient.create_pit(index=index, params={"keep_alive": keep_alive})
+        pit_id = pit["pit_id"]
+        search_after = None
+        fetched = 0
+        try:
+            while not max_documents or fetched < max_documents:
+                size = page_size if not max_documents else min(page_size, max_documents - fetched)
+                # Collapsing does not combine with search_after on the time sort
+                body = self._search_body(opensearch_query, collapse=False)
+                body.update({
+                    "size": size,
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    # _shard_doc breaks ties between hits logged at the same time without _id fielddata
+                    "sort": [{"time": "asc"}, {"_shard_doc": "asc"}],
+                    "track_total_hits": False,
+                })
+                if search_after is not None:
+                    body["search_after"] = search_after
+
+                # Point in time searches take neither a preference nor the request cache
+                result = await self._aclient.search(body=body)
+                pit_id = result.get("pit_id", pit_id)
+                hits = result["hits"]["hits"]
+                if not hits:
+                    return
+                fetched += len(hits)
+                search_after = hits[-1]["sort"]
+                yield self._to_documents(result)
+                if len(hits) < size:
+                    return
+        finally:
+            try:
+                await self._aclient.delete_pit(body={"pit_id": [pit_id]})
+            except Exception as e:
+                print(f"--- Failed to delete point in time: {e}")
+
+    @staticmethod
+    def _pin_time(opensearch_query: Dict[str, Any]) -> Dict[str, Any]:
+        """Pin `now` based time bounds to rounded absolute times, so shards can cache the request.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            
+        Returns:
+            The query with absolute time bounds
+        """
+        granularity = settings.opensearch_time_rounding_seconds
+        if granularity <= 0:
+            return opensearch_query
+        try:
+            return pin_relative_bounds(opensearch_query, datetime.now(timezone.utc), granularity)
+        except ValueError as e:
+            print(f"--- Keeping relative time bounds: {e}")
+            return opensearch_query
+
+    @staticmethod
+    def _search_params(body: Dict[str, Any]) -> Dict[str, str]:
+        """Ask shards to cache the request and route identical requests to the same shard copies.
+        
+        Args:
+            body: The search request body
+            
+        Returns:
+            The search URL parameters
+        """
+        if not settings.opensearch_request_cache:
+            return {}
+        return {"request_cache": "true", "preference": fingerprint(body)}
+
+    def _cached_documents(self, index: str, body: Dict[str, Any]) -> Tuple[Optional[str], Optional[List[Document]]]:
+        """Look a search request up in the result cache.
+        
+        Args:
+            index: The indices to search
+            body: The search request body
+            
+        Returns:
+            The cache key (None with the cache off) and the cached documents, if any
+        """
+        if self._result_cache is None:
+            return None, None
+        cache_key = self._result_cache.key(index, body)
+        docs = self._result_cache.get(cache_key)
+        if docs is not None:
+            print(f"--- RESULT CACHE HIT: {len(docs)} documents, {self._result_cache.stats()}")
+        return cache_key, docs
+
+    def result_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Size and hit/miss counters of the result cache, or None when it is off."""
+        return self._result_cache.stats() if self._result_cache is not None else None
+
+    def _resolve_index(self, opensearch_query: Dict[str, Any]) -> str:
+        """Pick the indices to search for a query.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            
+        Returns:
+            The concrete daily indices of the query, the configured index pattern,
+            or an empty string when no index holds hits of the query
+        """
+        if self._index_resolver is None:
+            return self.index
+        listing = self._index_resolver.known_indices()
+        if listing is None and not self._index_resolver.listing_failed():
+            try:
+                rows = self._client.cat.indices(index=self._index_resolver.listing_pattern(), format="json", h="index,status")
+                listing = self._index_resolver.remember_indices(rows)
+            except Exception as e:
+                self._index_resolver.remember_failure()
+                print(f"--- Failed to list indices: {e}")
+        return self._resolved_index(opensearch_query, listing)
+
+    async def _aresolve_index(self, opensearch_query: Dict[str, Any]) -> str:
+        """Pick the indices to search for a query.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            
+        Returns:
+            The concrete daily indices of the query, the configured index pattern,
+            or an empty string when no index holds hits of the query
+        """
+        if self._index_resolver is None:
+            return self.index
+        listing = self._index_resolver.known_indices()
+        if listing is None and not self._index_resolver.listing_failed():
+            try:
+                rows = await self._aclient.cat.indices(index=self._index_resolver.listing_pattern(), format="json", h="index,status")
+                listing = self._index_resolver.remember_indices(rows)
+            except Exception as e:
+                self._index_resolver.remember_failure()
+                print(f"--- Failed to list indices: {e}")
+        return self._resolved_index(opensearch_query, listing)
+
+    def _resolved_index(self, opensearch_query: Dict[str, Any], listing: Optional[Listing]) -> str:
+        index = self._index_resolver.resolve(opensearch_query, listing)
+        if index is None:
+            index = self.index
+        print(f"--- Searching indices: {index or 'none, no index covers the time range'}")
+        return index
+
+    def _search_body(
+        self, opensearch_query: Dict[str, Any], collapse: bool = settings.opensearch_collapse_enabled
+    ) -> Dict[str, Any]:
+        """Build the search request, fetching only the fields the documents are made of.
+        
+        With highlighting on, msg is not fetched at all: OpenSearch returns the
+        fragments that match the query and a script field cuts the stack trace
+        section out of the message.
+        
+        With collapsing on, hits are collapsed on the message fingerprint, so
+        each of the `opensearch_query_size` hits is a distinct message.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            collapse: Collapse hits on the fingerprint field
+            
+        Returns:
+            The search request body
+        """
+        body: Dict[str, Any] = {
+            "query": opensearch_query,
+            "size": self.opensearch_query_size,
+            "_source": {"includes": list(SOURCE_FIELDS)},
+        }
+        if collapse:
+            body["collapse"] = {"field": settings.opensearch_fingerprint_field}
+        if settings.opensearch_highlight_enabled:
+            body["_source"]["includes"].remove("msg")
+            body["highlight"] = {
+                "pre_tags": [""],
+                "post_tags": [""],
+                "fields": {
+                    "msg": {
+                        "fragment_size": settings.opensearch_highlight_fragment_size,
+                        "number_of_fragments": settings.opensearch_highlight_fragments,
+                        # Filter-only queries match nothing in msg, return its beginning instead
+                        "no_match_size": settings.opensearch_highlight_fragment_size,
+                    }
+                },
             }
-        )
+            body["script_fields"] = {
+                "stack_trace": {
+                    "script": {
+                        "lang": "painless",
+                        "source": STACK_TRACE_SCRIPT,
+                        "params": {"max_chars": settings.opensearch_stack_trace_max_chars},
+                    }
+                }
+            }
+        return body
 
+    def _occurrence_stats_body(self, opensearch_query: Dict[str, Any], docs: List[Document]) -> Optional[Dict[str, Any]]:
+        """Build a request counting every collapsed message and its first and last time.
+        
+        Args:
+            opensearch_query: The OpenSearch query
+            docs: The collapsed documents
+            
+        Returns:
+            The search request body, or None when no document has a fingerprint
+        """
+        fingerprints = [doc.metadata["fingerprint"] for doc in docs if doc.metadata.get("fingerprint") is not None]
+        if not fingerprints:
+            return None
+        return {
+            "query": opensearch_query,
+            "size": 0,
+            "aggs": {
+                "fingerprints": {
+                    "terms": {
+                        "field": settings.opensearch_fingerprint_field,
+                        "include": fingerprints,
+                        "size": len(fingerprints),
+                    },
+                    "aggs": {
+                        "first_seen": {"min": {"field": "time"}},
+                        "last_seen": {"max": {"field": "time"}},
+                    },
+                }
+            },
+        }
+
+    @staticmethod
+    def _add_occurrence_stats(docs: List[Document], result: Dict[str, Any]) -> None:
+        """Store the count and time span of each collapsed message in its document's metadata.
+        
+        Args:
+            docs: The collapsed documents
+            result: The response to the `_occurrence_stats_body` request
+        """
+        buckets = {bucket["key"]: bucket for bucket in result["aggregations"]["fingerprints"]["buckets"]}
+        for doc in docs:
+            bucket = buckets.get(doc.metadata.get("fingerprint"))
+            if bucket is None:
+                continue
+            doc.metadata["occurrence_count"] = bucket["doc_count"]
+            doc.metadata["first_seen"] = bucket["first_seen"].get("value_as_string")
+            doc.metadata["last_seen"] = bucket["last_seen"].get("value_as_string")
+        print(f"--- OCCURRENCES: {[doc.metadata.get('occurrence_count') for doc in docs]} END ---")
+
+    def _to_documents(self, result: Dict[str, Any]) -> List[Document]:
+        """Convert search hits to Documents.
+        
+        Args:
+            result: The search response
+            
+        Returns:
+            List of found documents
+        """
         print(f"--- RETRIEVED {len(result['hits']['hits'])} documents")
         
-        # Convert OpenSearch results to Documents
         docs = []
         for hit in result["hits"]["hits"]:
-            source = hit["_source"]
-            print(f"--- DOC: {source} END ---")
+            source = hit.get("_source", {})
+            fragments = hit.get("highlight", {}).get("msg")
+            msg = " … ".join(fragments) if fragments else source.get("msg", "")
+            print(f"--- DOC: {msg[:500]} END ---")
             
             # Extract stack trace if present
-            stack_trace = ""
-            msg = source.get("msg", "")
-            if "stack:" in msg:
+            if "stack_trace" in hit.get("fields", {}):
+                stack_trace = hit["fields"]["stack_trace"][0]
+            else:
                 stack_start = msg.find("stack:")
-                if stack_start != -1:
-                    stack_trace = msg[stack_start:].strip()
-            
-            docs.append(
-                Document(
-                    page_content=msg,
-                    metadata={
-                        "level": source.get("level"),
-                        "ns": source.get("ns"),
-                        "svc": source.get("svc"),
-                        "time": source.get("time"),
-                        "score": hit["_score"],
-                        "stack_trace": stack_trace
-                    }
-                )
-            )
+                stack_trace = msg[stack_start:].strip() if stack_start != -1 else ""
+            
+            metadata = {
+                "level": source.get("level"),
+                "ns": source.get("ns"),
+                "svc": source.get("svc"),
+                "time": source.get("time"),
+                "score": hit["_score"],
+                "stack_trace": stack_trace
+            }
+            # Collapsed hits carry the value they were collapsed on
+            fingerprint = hit.get("fields", {}).get(settings.opensearch_fingerprint_field)
+            if fingerprint:
+                metadata["fingerprint"] = fingerprint[0]
+            docs.append(Document(page_content=msg, metadata=metadata))
         
         return docs
 
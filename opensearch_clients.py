@@ -0,0 +1,162 @@
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Tuple
+
+from opensearchpy import AIOHttpConnection, AsyncOpenSearch, OpenSearch, Urllib3HttpConnection
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Counts the requests a client has in flight against the size of its connection pool."""
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.failures = 0
+
+    def _start(self) -> None:
+        self.in_flight += 1
+        self.requests += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    @contextmanager
+    def track(self):
+        self._start()
+        try:
+            yield
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    @asynccontextmanager
+    async def atrack(self):
+        with self.track():
+            yield
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "peak_utilisation": round(self.peak / self.pool_size, 2) if self.pool_size else None,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class TrackedUrllib3HttpConnection(Urllib3HttpConnection):
+    def __init__(self, *args: Any, pool_stats: PoolStats, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.pool_stats = pool_stats
+
+    def perform_request(self, *args: Any, **kwargs: Any) -> Any:
+        with self.pool_stats.track():
+            return super().perform_request(*args, **kwargs)
+
+
+class TrackedAIOHttpConnection(AIOHttpConnection):
+    def __init__(self, *args: Any, pool_stats: PoolStats, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.pool_stats = pool_stats
+
+    async def perform_request(self, *args: Any, **kwargs: Any) -> Any:
+        async with self.pool_stats.atrack():
+            return await super().perform_request(*args, **kwargs)
+
+
+class OpenSearchClients:
+    """Process-wide registry of pooled OpenSearch clients.
+
+    Every retriever connecting with the same parameters shares one sync and
+    one async client, so connections are reused across chats instead of each
+    retriever holding its own pool. Call `close()` on shutdown.
+    """
+    def __init__(self):
+        self._sync: Dict[Tuple, Tuple[OpenSearch, PoolStats]] = {}
+        self._async: Dict[Tuple, Tuple[AsyncOpenSearch, PoolStats]] = {}
+
+    @staticmethod
+    def _options(host: str, port: int, username: str, password: str, use_ssl: bool, verify_certs: bool) -> Dict[str, Any]:
+        return {
+            "hosts": [{"host": host, "port": port}],
+            "http_auth": (username, password) if username else None,
+            "use_ssl": use_ssl,
+            "verify_certs": verify_certs,
+            "ssl_show_warn": False,
+            "timeout": settings.opensearch_timeout,
+            "max_retries": settings.opensearch_max_retries,
+            "retry_on_timeout": settings.opensearch_retry_on_timeout,
+            "headers": {"Connection": "keep-alive" if settings.opensearch_keep_alive else "close"},
+        }
+
+    def get(
+        self,
+        host: str = settings.opensearch_host,
+        port: int = settings.opensearch_port,
+        username: str = settings.opensearch_username,
+        password: str = settings.opensearch_password,
+        use_ssl: bool = settings.opensearch_use_ssl,
+        verify_certs: bool = settings.opensearch_verify_certs
+    ) -> OpenSearch:
+        """Return the shared sync client for these connection parameters."""
+        key = (host, port, username, password, use_ssl, verify_certs)
+        if key not in self._sync:
+            stats = PoolStats(settings.opensearch_pool_maxsize)
+            client = OpenSearch(
+                **self._options(*key),
+                connection_class=TrackedUrllib3HttpConnection,
+                pool_maxsize=settings.opensearch_pool_maxsize,
+                pool_stats=stats
+            )
+            self._sync[key] = (client, stats)
+        return self._sync[key][0]
+
+    def aget(
+        self,
+        host: str = settings.opensearch_host,
+        port: int = settings.opensearch_port,
+        username: str = settings.opensearch_username,
+        password: str = settings.opensearch_password,
+        use_ssl: bool = settings.opensearch_use_ssl,
+        verify_certs: bool = settings.opensearch_verify_certs
+    ) -> AsyncOpenSearch:
+        """Return the shared async client for these connection parameters."""
+        key = (host, port, username, password, use_ssl, verify_certs)
+        if key not in self._async:
+            stats = PoolStats(settings.opensearch_pool_maxsize)
+            client = AsyncOpenSearch(
+                **self._options(*key),
+                connection_class=TrackedAIOHttpConnection,
+                maxsize=settings.opensearch_pool_maxsize,
+                pool_stats=stats
+            )
+            self._async[key] = (client, stats)
+        return self._async[key][0]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Pool utilisation of every client, keyed by "sync|async host:port"."""
+        result = {}
+        for kind, registry in (("sync", self._sync), ("async", self._async)):
+            for key, (_, stats) in registry.items():
+                result[f"{kind} {key[0]}:{key[1]}"] = stats.snapshot()
+        return result
+
+    async def close(self) -> None:
+        """Close every client and its connections."""
+        for name, snapshot in self.stats().items():
+            logger.info(f"OpenSearch client {name}: {snapshot}")
+        for client, _ in self._sync.values():
+            client.close()
+        for client, _ in self._async.values():
+            await client.close()
+        self._sync.clear()
+        self._async.clear()
+
+
+clients = OpenSearchClients()
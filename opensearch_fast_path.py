@@ -0,0 +1,210 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Offset the query constructor uses for absolute times and times of day
+TIME_ZONE = "+03:00"
+
+_MONTHS = {
+    name: number for number, name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"], 1
+    )
+}
+_UNITS = {"minute": "m", "hour": "h", "day": "d", "week": "w", "month": "M", "year": "y"}
+_LEVELS = {"error": "error", "warning": "warn", "warn": "warn", "info": "info", "debug": "debug"}
+
+_DATE = r"(\d{4}-\d{2}-\d{2})"
+_CLOCK = r"(\d{1,2}:\d{2}(?::\d{2})?)"
+
+_DATE_RANGE = re.compile(rf"\bfrom {_DATE}(?:[ T]{_CLOCK})? to {_DATE}(?:[ T]{_CLOCK})?", re.IGNORECASE)
+_CLOCK_RANGE = re.compile(rf"\bfrom {_CLOCK} to (now|{_CLOCK})", re.IGNORECASE)
+_ON_DATE = re.compile(rf"\b(?:on|at|for) {_DATE}", re.IGNORECASE)
+_ON_MONTH_DAY = re.compile(rf"\b(?:on|at|for) ({'|'.join(_MONTHS)}) (\d{{1,2}})(?:st|nd|rd|th)?,? (\d{{4}})", re.IGNORECASE)
+_TODAY = re.compile(r"\btoday\b", re.IGNORECASE)
+_YESTERDAY = re.compile(r"\byesterday\b", re.IGNORECASE)
+_THIS = re.compile(r"\bthis (week|month|year)\b", re.IGNORECASE)
+_LAST = re.compile(rf"\b(?:in |for |during )?(?:the )?(?:last|past) (?:(\d+) )?({'|'.join(_UNITS)})s?\b", re.IGNORECASE)
+
+_NS = re.compile(r"\b(?:(?:in|on|at|from) )?(prod|production|test)\b", re.IGNORECASE)
+_TOPIC = re.compile(r"\b(?:in |on |from )?topic ([\w.-]+)", re.IGNORECASE)
+# Business IDs, e.g. PSV-745559, NM0098877, PSV-737844-К0015742
+_ID = re.compile(r"\b(?:(?:order|item|customer|contract|invoice|product)s? )?([A-ZА-ЯЁ]{2,4}-?\d{4,}(?:-[A-ZА-ЯЁ]?\d+)*)\b", re.IGNORECASE)
+_LEAD = re.compile(
+    r"^\s*(?:what (?:are|were|is|was)(?: the)? steps of|what (?:is|was) wrong with|what happened (?:with|to)"
+    r"|what (?:are|were|is|was)(?: the)?|show(?: me)?(?: the)?|list(?: the)?|find(?: the)?|get(?: the)?)\b",
+    re.IGNORECASE
+)
+_SUBJECT_AND_LEVEL = re.compile(
+    r"^\s*(?:all |any )?(?P<subject>[\w\s-]*?)\s*\b(?P<level>errors?|warnings?|warns?|info|debug|logs?|messages?|events?)"
+    r"(?:\s+(?:messages?|logs?|events?))?\b",
+    re.IGNORECASE
+)
+_FILLER = re.compile(r"\b(?:and|all|any|the|there|of|with|happened)\b", re.IGNORECASE)
+# Subject words that change the meaning of the question instead of naming what to search for
+_NEGATIONS = {"not", "no", "non", "never", "except", "without", "excluding", "but"}
+_TIME_ADJECTIVES = {"latest", "recent", "new", "newest", "last", "first", "old", "oldest", "current", "previous", "earlier"}
+_STOPWORDS = {"a", "an", "the", "some", "my", "our", "these", "those", "this", "that", "other", "top", "most", "many", "only"}
+_INTERROGATIVES = {
+    "how", "what", "which", "who", "when", "where", "why", "whose", "much", "often",
+    "are", "is", "were", "was", "do", "does", "did", "there", "me", "show", "list", "find", "get",
+}
+_NOT_SUBJECT = _NEGATIONS | _TIME_ADJECTIVES | _STOPWORDS | _INTERROGATIVES
+
+
+@dataclass
+class FastPathResult:
+    """A query built by the rule-based translator.
+
+    `confident` is False when parts of the question were not understood; such
+    a query is only a guess and should be checked against the LLM.
+    """
+    query: Dict[str, Any]
+    confident: bool
+
+
+def _clock_to_date_math(clock: str) -> str:
+    parts = [int(part) for part in clock.split(":")] + [0]
+    hours, minutes, seconds = parts[0], parts[1], parts[2]
+    expr = f"now/d+{hours}h"
+    if minutes or seconds:
+        expr += f"{minutes}m"
+    if seconds:
+        expr += f"{seconds}s"
+    return expr
+
+
+def _clock(clock: Optional[str], default: str) -> str:
+    if not clock:
+        return default
+    return clock if clock.count(":") == 2 else f"{clock}:00"
+
+
+class RuleBasedQueryTranslator:
+    """Deterministic translator for the common question shapes.
+
+    Handles a log level, an ns (prod/test), a relative or absolute time window,
+    business IDs, a topic and a short free-text subject, e.g.
+    "What are crm errors in prod today?" or "What happened with order PSV-745559?".
+    """
+
+    def translate(self, question: str) -> Optional[FastPathResult]:
+        """Build an OpenSearch query, or None if the question has no known shape."""
+        text = question.strip().rstrip("?!. ")
+        filters: List[Dict[str, Any]] = []
+        must: List[Dict[str, Any]] = []
+
+        time_range, text = self._extract_time_range(text)
+
+        topics = [match.group(1) for match in _TOPIC.finditer(text)]
+        text = _TOPIC.sub(" ", text)
+
+        ids = [match.group(1) for match in _ID.finditer(text)]
+        text = _ID.sub(" ", text)
+
+        ns_match = _NS.search(text)
+        ns = None
+        if ns_match:
+            ns = "prod" if ns_match.group(1).lower().startswith("prod") else "test"
+            text = text[:ns_match.start()] + " " + text[ns_match.end():]
+
+        lead = _LEAD.match(text)
+        if lead:
+            text = text[lead.end():]
+
+        level = None
+        subject = ""
+        unsure_subject = False
+        subject_match = _SUBJECT_AND_LEVEL.match(text)
+        if subject_match:
+            level_word = subject_match.group("level").lower().rstrip("s")
+            level = _LEVELS.get(level_word)
+            words = subject_match.group("subject").split()
+            subject = " ".join(word for word in words if word.lower() not in _NOT_SUBJECT)
+            # "not errors", "latest errors" or "how many errors" are not searched as text; leave them to the LLM
+            unsure_subject = len(subject.split()) != len(words)
+            if subject and level:
+                # "crm errors" is searched as "crm error", like in the prompt examples
+                noun = "warning" if level == "warn" else level
+                must.append({"match": {"msg": f"{subject} {noun}"}})
+            elif subject:
+                must.append({"match": {"msg": subject}})
+            text = text[subject_match.end():]
+
+        if level:
+            filters.append({"term": {"level": level}})
+        if ns:
+            filters.append({"term": {"ns": ns}})
+        if time_range:
+            filters.append({"range": {"time": time_range}})
+        must.extend({"term": {"msg": value}} for value in topics + ids)
+
+        if not filters and not must:
+            return None
+
+        leftover = _FILLER.sub(" ", text).strip(" ,.-")
+        confident = bool(lead) and not leftover and not unsure_subject
+
+        query: Dict[str, Any] = {"bool": {}}
+        if filters:
+            query["bool"]["filter"] = filters
+        if must:
+            query["bool"]["must"] = must
+        return FastPathResult(query=query, confident=confident)
+
+    @staticmethod
+    def _extract_time_range(text: str) -> Tuple[Optional[Dict[str, str]], str]:
+        """Find one time expression, returning the range and the text without it."""
+        match = _DATE_RANGE.search(text)
+        if match:
+            start_date, start_clock, end_date, end_clock = match.groups()
+            time_range = {
+                "gte": f"{start_date}T{_clock(start_clock, '00:00:00')}",
+                "lte": f"{end_date}T{_clock(end_clock, '23:59:59')}",
+                "time_zone": TIME_ZONE,
+            }
+            return time_range, text[:match.start()] + " " + text[match.end():]
+
+        match = _CLOCK_RANGE.search(text)
+        if match:
+            start, end = match.group(1), match.group(2)
+            time_range = {
+                "gte": _clock_to_date_math(start),
+                "lte": "now" if end.lower() == "now" else _clock_to_date_math(end),
+                "time_zone": TIME_ZONE,
+            }
+            return time_range, text[:match.start()] + " " + text[match.end():]
+
+        day = None
+        match = _ON_DATE.search(text)
+        if match:
+            day = match.group(1)
+        else:
+            match = _ON_MONTH_DAY.search(text)
+            if match:
+                month, day_of_month, year = match.groups()
+                day = f"{year}-{_MONTHS[month.lower()]:02d}-{int(day_of_month):02d}"
+        if day:
+            time_range = {"gte": f"{day}T00:00:00", "lte": f"{day}T23:59:59", "time_zone": TIME_ZONE}
+            return time_range, text[:match.start()] + " " + text[match.end():]
+
+        for pattern, time_range in (
+            (_TODAY, {"gte": "now/d"}),
+            (_YESTERDAY, {"gte": "now-1d/d", "lt": "now/d"}),
+        ):
+            match = pattern.search(text)
+            if match:
+                return dict(time_range), text[:match.start()] + " " + text[match.end():]
+
+        match = _THIS.search(text)
+        if match:
+            # "this month" is read as the last month, as in the prompt examples
+            gte = {"week": "now/w", "month": "now-1M", "year": "now/y"}[match.group(1).lower()]
+            return {"gte": gte}, text[:match.start()] + " " + text[match.end():]
+
+        match = _LAST.search(text)
+        if match:
+            amount, unit = match.group(1) or "1", match.group(2).lower()
+            return {"gte": f"now-{amount}{_UNITS[unit]}"}, text[:match.start()] + " " + text[match.end():]
+
+        return None, text
@@ -1,10 +1,19 @@
-from typing import Dict, Any, List, Tuple
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 import json
 from pprint import pprint
 from config import settings
+from opensearch_fast_path import RuleBasedQueryTranslator
+from translation_cache import TranslationCache
+from example_selector import BM25ExampleSelector, format_example, load_examples
+from prompt_warmup import prefill
+from opensearch_query_validator import InvalidQueryError, OpenSearchQueryValidator
+
+logger = logging.getLogger(__name__)
 
 class OpenSearchQuery(BaseModel):
     """OpenSearch query structure."""
@@ -16,13 +25,19 @@ class OpenSearchQueryConstructor:
     """Constructs OpenSearch queries from natural language questions."""
     
     def __init__(self):
+        self.fast_path = RuleBasedQueryTranslator() if settings.opensearch_fast_path_enabled else None
+        self.translation_cache = TranslationCache() if settings.translation_cache_enabled else None
+        self.validator = OpenSearchQueryValidator()
         self.llm = ChatOllama(
             base_url=settings.opensearch_retriever_ollama_base_url,
             model=settings.opensearch_retriever_ollama_model,
             temperature=settings.opensearch_retriever_ollama_temperature,
-            num_ctx=settings.opensearch_retriever_ollama_num_ctx
+            num_ctx=settings.opensearch_retriever_ollama_num_ctx,
+            keep_alive=settings.ollama_keep_alive
         )
         
+        # Everything up to {examples} is the same for every question, so Ollama
+        # can reuse its KV cache for it; selected examples and the question come last
         self.base_template = (
             "You are an assistant that converts user questions into OpenSearch queries. "
             "The query must have a 'bool' structure with 'filter' and 'must' sections. "
@@ -37,6 +52,7 @@ class OpenSearchQueryConstructor:
             "The output must be a valid JSON object, nothing else. "
             "When using exact time (not relative like 'now'), add 'time_zone': '+03:00' to the time range. "
             "Here are some examples:\n\n"
+            "{pinned_examples}\n"
             "{examples}\n"
             "User: {question}\n"
             "OpenSearch query:\n"
@@ -250,44 +266,205 @@ class OpenSearchQueryConstructor:
             )
         ]
         
+        if settings.opensearch_examples_path:
+            self.examples.extend(load_examples(settings.opensearch_examples_path))
+        # The first examples are always sent as part of the static prefix, the rest are selected per question
+        pinned = self.examples[:settings.opensearch_pinned_examples]
+        selectable = self.examples[len(pinned):]
+        self.example_selector = BM25ExampleSelector(selectable, k=settings.opensearch_examples_k)
+
         # Create structured output chain
         structured_llm = self.llm.with_structured_output(OpenSearchQuery)
-        self.chain = PromptTemplate(
+        self.prompt = PromptTemplate(
             input_variables=["examples", "question"],
-            template=self.base_template
-        ) | structured_llm
+            template=self.base_template,
+            partial_variables={"pinned_examples": "\n".join(format_example(q, query) for q, query in pinned)}
+        )
+        self.chain = self.prompt | structured_llm
     
-    def _format_examples(self) -> str:
-        """Format examples for the prompt template."""
-        formatted_examples = []
-        for question, query in self.examples:
-            # Convert the query dict to a nicely formatted JSON string
-            query_str = json.dumps(query, indent=2)
-            formatted_examples.append(f"User: {question}\nOpenSearch query:\n{query_str}\n")
-        return "\n".join(formatted_examples)
+    def _format_examples(self, question: Optional[str] = None) -> str:
+        """Format the selected examples most similar to the question, or all of them, for the prompt template."""
+        if question is None:
+            return self.example_selector.format("", k=len(self.example_selector.examples))
+        return self.example_selector.format(question)
+
+    async def awarmup(self) -> float:
+        """Load the model and prefill the static prompt prefix; returns the time taken."""
+        return await prefill(self.prompt | self.llm, {"examples": "", "question": ""})
     
+    def _known_query(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return a cached translation or a confident rule-based one, otherwise None."""
+        if self.translation_cache is not None:
+            query = self.translation_cache.get(question)
+            if query is not None:
+                return query
+        if self.fast_path is None:
+            return None
+        result = self.fast_path.translate(question)
+        if result is None or not result.confident:
+            return None
+        return result.query
+
+    def _remember(self, question: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        if self.translation_cache is not None:
+            self.translation_cache.set(question, query)
+        return query
+
     def construct_query(self, question: str) -> Dict[str, Any]:
         """Construct an OpenSearch query from a natural language question."""
+        query = self._known_query(question)
+        if query is not None:
+            return query
+
         # Format the prompt with examples
         result = self.chain.invoke({
-            "examples": self._format_examples(),
+            "examples": self._format_examples(question),
             "question": question
         })
         
         # Convert the Pydantic model to a dict
-        return result.model_dump()
+        return self._remember(question, result.model_dump())
 
     async def aconstruct_query(self, question: str) -> Dict[str, Any]:
         """Construct an OpenSearch query from a natural language question asynchronously."""
+        query = self._known_query(question)
+        if query is not None:
+            return query
+
         # Format the prompt with examples
         result = await self.chain.ainvoke({
-            "examples": self._format_examples(),
+            "examples": self._format_examples(question),
             "question": question
         })
         
         # Convert the Pydantic model to a dict
+        return self._remember(question, result.model_dump())
+
+    async def aconstruct_queries(
+        self,
+        questions: List[str],
+        concurrency: int = settings.translation_batch_concurrency
+    ) -> List[Dict[str, Any]]:
+        """Construct queries for several questions, at most `concurrency` at a time.
+
+        Results are in the order of the questions.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def construct(question: str) -> Dict[str, Any]:
+            async with slots:
+                return await self.aconstruct_query(question)
+
+        return list(await asyncio.gather(*(construct(question) for question in questions)))
+
+    def construct_queries(
+        self,
+        questions: List[str],
+        concurrency: int = settings.translation_batch_concurrency
+    ) -> List[Dict[str, Any]]:
+        """Construct queries for several questions; must not be called from a running event loop."""
+        return asyncio.run(self.aconstruct_queries(questions, concurrency))
+
+    def _validate(self, question: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        repaired, repairs = self.validator.repair(query)
+        if repairs:
+            logger.info(f"Repaired the query for '{question}': {'; '.join(repairs)}")
+        return repaired
+
+    @staticmethod
+    def _correction_request(question: str, query: Dict[str, Any], error: InvalidQueryError) -> str:
+        # Asked in place of the question, so the prompt prefix stays the same
+        return (
+            f"{question}\n"
+            f"(The query {json.dumps(query)} was rejected: {error}. Output a corrected query.)"
+        )
+
+    def construct_valid_query(self, question: str) -> Dict[str, Any]:
+        """Construct a query that passed validation.
+
+        Mistakes are repaired locally; the LLM is asked once more only when
+        that fails.
+
+        Raises:
+            InvalidQueryError: when the corrected query is still invalid
+        """
+        query = self.construct_query(question)
+        try:
+            return self._validate(question, query)
+        except InvalidQueryError as e:
+            logger.warning(f"Re-prompting for '{question}': {e}")
+            result = self.chain.invoke({
+                "examples": self._format_examples(question),
+                "question": self._correction_request(question, query, e)
+            })
+        return self._remember(question, self._validate(question, result.model_dump()))
+
+    def cached_query(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the validated cached translation of the question, or None."""
+        if self.translation_cache is None:
+            return None
+        query = self.translation_cache.get(question)
+        return None if query is None else self._validate(question, query)
+
+    def rule_based_query(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the validated rule-based translation when the parser is confident, or None."""
+        if self.fast_path is None:
+            return None
+        result = self.fast_path.translate(question)
+        if result is None or not result.confident:
+            return None
+        return self._validate(question, result.query)
+
+    def rule_based_guess(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the validated rule-based translation even when the parser is unsure, or None."""
+        if self.fast_path is None:
+            return None
+        result = self.fast_path.translate(question)
+        if result is None:
+            return None
+        try:
+            return self._validate(question, result.query)
+        except InvalidQueryError:
+            return None
+
+    async def allm_translate(self, question: str) -> Dict[str, Any]:
+        """Translate with the LLM only, without validation or caching."""
+        result = await self.chain.ainvoke({
+            "examples": self._format_examples(question),
+            "question": question
+        })
         return result.model_dump()
 
+    async def allm_query(self, question: str) -> Dict[str, Any]:
+        """Translate with the LLM only, validating the query and re-prompting once if needed.
+
+        Raises:
+            InvalidQueryError: when the corrected query is still invalid
+        """
+        query = await self.allm_translate(question)
+        try:
+            return self._remember(question, self._validate(question, query))
+        except InvalidQueryError as e:
+            logger.warning(f"Re-prompting for '{question}': {e}")
+            result = await self.chain.ainvoke({
+                "examples": self._format_examples(question),
+                "question": self._correction_request(question, query, e)
+            })
+        return self._remember(question, self._validate(question, result.model_dump()))
+
+    async def aconstruct_valid_query(self, question: str) -> Dict[str, Any]:
+        """Construct a query that passed validation asynchronously, see `construct_valid_query`."""
+        query = await self.aconstruct_query(question)
+        try:
+            return self._validate(question, query)
+        except InvalidQueryError as e:
+            logger.warning(f"Re-prompting for '{question}': {e}")
+            result = await self.chain.ainvoke({
+                "examples": self._format_examples(question),
+                "question": self._correction_request(question, query, e)
+            })
+        return self._remember(question, self._validate(question, result.model_dump()))
+
 if __name__ == "__main__":
     constructor = OpenSearchQueryConstructor()
     
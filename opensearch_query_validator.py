@@ -0,0 +1,192 @@
+import copy
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from date_math import find_time_range, parse_date_math
+from opensearch_fast_path import TIME_ZONE
+
+# The fields of the log index; everything else is a mistake of the model
+FIELDS = {"level", "ns", "svc", "time", "msg"}
+KEYWORD_FIELDS = {"level", "ns", "svc"}
+FIELD_ALIASES = {
+    "message": "msg", "text": "msg", "log": "msg",
+    "service": "svc", "namespace": "ns", "env": "ns",
+    "severity": "level", "log_level": "level", "loglevel": "level",
+    "timestamp": "time", "@timestamp": "time",
+}
+LEVEL_ALIASES = {"warning": "warn", "err": "error", "information": "info"}
+CLAUSE_TYPES = {"term", "terms", "match", "match_phrase", "range"}
+BOOL_SECTIONS = ("filter", "must", "should", "must_not")
+RANGE_BOUNDS = ("gt", "gte", "lt", "lte")
+
+_COMPOUND_STEP = re.compile(r"([+-])((?:\d+[yMwdhHms]){2,})")
+_STEP = re.compile(r"\d+[yMwdhHms]")
+
+
+class InvalidQueryError(ValueError):
+    """A generated query that cannot be repaired locally."""
+
+
+def split_date_math(expr: str) -> str:
+    """Spell every date math step with its own sign: "now/d+16h35m11s" -> "now/d+16h+35m+11s"."""
+    return _COMPOUND_STEP.sub(lambda m: "".join(m.group(1) + step for step in _STEP.findall(m.group(2))), expr)
+
+
+class OpenSearchQueryValidator:
+    """Checks generated queries against the log index fields and fixes common mistakes.
+
+    Repairs msg clauses in `filter`, keyword clauses in `must`, field name
+    aliases, absolute ranges without a time_zone and compound date math.
+    A query without a time bound gets `default_window` as its lower bound,
+    or is rejected when no default window is configured.
+    """
+    def __init__(self, default_window: str = settings.opensearch_default_time_window):
+        self.default_window = default_window
+
+    def repair(self, query: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """Return the repaired query and a description of every repair.
+
+        Raises:
+            InvalidQueryError: when the query cannot be fixed locally
+        """
+        repairs: List[str] = []
+        query = copy.deepcopy(query)
+        if "query" in query and len(query) == 1 and isinstance(query["query"], dict):
+            query = query["query"]
+            repairs.append("unwrapped 'query'")
+        if set(query) != {"bool"} or not isinstance(query["bool"], dict):
+            raise InvalidQueryError(f"expected a single 'bool' query, got keys {sorted(query)}")
+
+        query = {"bool": self._repair_bool(query["bool"], repairs)}
+        if not any(query["bool"].get(section) for section in BOOL_SECTIONS):
+            raise InvalidQueryError("the query has no clauses")
+
+        if find_time_range(query) is None:
+            if not self.default_window:
+                raise InvalidQueryError("the query has no time bound")
+            cap = {"range": {"time": {"gte": f"now-{self.default_window}"}}}
+            rest = {section: clauses for section, clauses in query["bool"].items() if section != "filter"}
+            query = {"bool": {"filter": query["bool"].get("filter", []) + [cap], **rest}}
+            repairs.append(f"capped the query to the last {self.default_window}")
+        return query, repairs
+
+    def _repair_bool(self, bool_query: Dict[str, Any], repairs: List[str]) -> Dict[str, Any]:
+        unknown = set(bool_query) - set(BOOL_SECTIONS) - {"minimum_should_match"}
+        if unknown:
+            raise InvalidQueryError(f"unsupported bool sections: {sorted(unknown)}")
+
+        sections: Dict[str, List[Dict[str, Any]]] = {section: [] for section in BOOL_SECTIONS}
+        for section in BOOL_SECTIONS:
+            clauses = bool_query.get(section) or []
+            if isinstance(clauses, dict):
+                clauses = [clauses]
+            for clause in clauses:
+                clause = self._repair_clause(clause, repairs)
+                if clause is None:
+                    continue
+                target = section
+                clause_type, field = self._describe(clause)
+                if section == "filter" and field == "msg":
+                    target = "must"
+                    repairs.append(f"moved a msg {clause_type} from filter to must")
+                elif section == "must" and (field in KEYWORD_FIELDS or clause_type == "range"):
+                    target = "filter"
+                    repairs.append(f"moved a {field} {clause_type} from must to filter")
+                sections[target].append(clause)
+
+        repaired = {section: clauses for section, clauses in sections.items() if clauses}
+        if "minimum_should_match" in bool_query and "should" in repaired:
+            repaired["minimum_should_match"] = bool_query["minimum_should_match"]
+        return repaired
+
+    @staticmethod
+    def _describe(clause: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        clause_type = next(iter(clause))
+        if clause_type == "bool":
+            return clause_type, None
+        return clause_type, next(iter(clause[clause_type]))
+
+    def _repair_clause(self, clause: Any, repairs: List[str]) -> Optional[Dict[str, Any]]:
+        if not isinstance(clause, dict) or len(clause) != 1:
+            raise InvalidQueryError(f"malformed clause: {clause}")
+        clause_type, body = next(iter(clause.items()))
+        if clause_type == "bool" and isinstance(body, dict):
+            return {"bool": self._repair_bool(body, repairs)}
+        if clause_type not in CLAUSE_TYPES:
+            raise InvalidQueryError(f"unsupported clause type: {clause_type}")
+        if not isinstance(body, dict) or len(body) != 1:
+            raise InvalidQueryError(f"malformed {clause_type} clause: {body}")
+
+        field, value = next(iter(body.items()))
+        if field not in FIELDS:
+            if field.lower() not in FIELD_ALIASES:
+                raise InvalidQueryError(f"unknown field: {field}")
+            repairs.append(f"renamed field {field} to {FIELD_ALIASES[field.lower()]}")
+            field = FIELD_ALIASES[field.lower()]
+
+        if clause_type == "range":
+            if field != "time":
+                raise InvalidQueryError(f"range on {field}, only time is a date field")
+            return {"range": {"time": self._repair_range(value, repairs)}}
+        if field == "time":
+            raise InvalidQueryError(f"{clause_type} on time, use a range")
+
+        if field in KEYWORD_FIELDS:
+            if clause_type in ("match", "match_phrase"):
+                repairs.append(f"turned a {field} {clause_type} into a term")
+                clause_type = "term"
+            if field == "level":
+                value = self._repair_level(value, repairs)
+        return {clause_type: {field: value}}
+
+    @staticmethod
+    def _repair_level(value: Any, repairs: List[str]) -> Any:
+        def fix(level: Any) -> Any:
+            if not isinstance(level, str):
+                return level
+            fixed = LEVEL_ALIASES.get(level.lower(), level.lower())
+            if fixed != level:
+                repairs.append(f"normalized level {level} to {fixed}")
+            return fixed
+
+        if isinstance(value, list):
+            return [fix(level) for level in value]
+        if isinstance(value, dict) and "value" in value:
+            return {**value, "value": fix(value["value"])}
+        return fix(value)
+
+    @staticmethod
+    def _repair_range(time_range: Any, repairs: List[str]) -> Dict[str, Any]:
+        if not isinstance(time_range, dict):
+            raise InvalidQueryError(f"malformed time range: {time_range}")
+        unknown = set(time_range) - set(RANGE_BOUNDS) - {"time_zone", "format"}
+        if unknown:
+            raise InvalidQueryError(f"unsupported range keys: {sorted(unknown)}")
+        if not any(bound in time_range for bound in RANGE_BOUNDS):
+            raise InvalidQueryError("time range without bounds")
+
+        time_range = dict(time_range)
+        now = datetime.now(timezone.utc)
+        absolute = False
+        for bound in RANGE_BOUNDS:
+            value = time_range.get(bound)
+            if value is None:
+                continue
+            if not isinstance(value, str):
+                raise InvalidQueryError(f"time bound {bound} must be a date string: {value}")
+            fixed = split_date_math(value)
+            if fixed != value:
+                repairs.append(f"split date math {value} into {fixed}")
+                time_range[bound] = fixed
+            try:
+                parse_date_math(fixed, now, time_range.get("time_zone"))
+            except ValueError as e:
+                raise InvalidQueryError(f"invalid time bound {bound}: {e}") from e
+            absolute = absolute or not fixed.startswith("now")
+
+        if absolute and not time_range.get("time_zone"):
+            time_range["time_zone"] = TIME_ZONE
+            repairs.append(f"added time_zone {TIME_ZONE} to an absolute range")
+        return time_range
@@ -3,6 +3,7 @@ from langchain_ollama import ChatOllama
 from langchain.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 from config import settings
+from prompt_warmup import prefill
 from typing import Literal
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ class OpenSearchRetrievalGrader:
             If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
             It does not need to be a stringent test. The goal is to filter out erroneous retrievals. \n
             Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.
-            Retrieved document: \n\n {document} \n\n User question: {question}
+            User question: {question} \n\n Retrieved document: \n\n {document}
             """
         )
 
@@ -31,12 +32,21 @@ class OpenSearchRetrievalGrader:
             model=settings.retrieval_grader_ollama_model,
             temperature=settings.retrieval_grader_ollama_temperature,
             streaming=True,
-            num_ctx=settings.retrieval_grader_ollama_num_ctx
+            num_ctx=settings.retrieval_grader_ollama_num_ctx,
+            keep_alive=settings.ollama_keep_alive
         )
 
         structured_llm = self._llm.with_structured_output(GradeDocuments)
         self.chain = self._prompt | structured_llm
 
+    async def awarmup(self) -> float:
+        """Load the model and prefill the instructions; returns the time taken.
+
+        The instructions come first and the document last, so consecutive
+        gradings for the same question share everything but the document.
+        """
+        return await prefill(self._prompt | self._llm, {"question": "", "document": ""})
+
     def invoke(self, question: str, document: str) -> str:
         """Grade document relevance to the question."""
         try:
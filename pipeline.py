@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream flowing through a queue
+_DONE = object()
+
+
+class StopPipeline(Exception):
+    """Raised by a stage worker to end the run early; outstanding work is cancelled."""
+
+
+@dataclass
+class Stage:
+    """A pipeline stage: `concurrency` workers applying `worker` to every item.
+
+    A worker returns the item for the next stage, or None to drop it.
+    """
+    name: str
+    worker: Callable[[Any], Awaitable[Optional[Any]]]
+    concurrency: int = 1
+
+
+class Pipeline:
+    """Runs stages concurrently, joined by bounded queues.
+
+    Each queue holds at most `queue_size` items, so a slow stage applies
+    backpressure to the stages in front of it instead of letting work pile up.
+    """
+    def __init__(self, stages: List[Stage], queue_size: int = 1):
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]]) -> None:
+        """Push items through all stages and wait until the last one is done.
+
+        Items may come from an async iterable, so the first stage can start
+        before the source is exhausted.
+        """
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        tasks = [asyncio.create_task(self._feed(items, queues[0]))]
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            tasks.append(asyncio.create_task(self._run_stage(stage, queues[i], outbox)))
+
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if isinstance(task.exception(), StopPipeline):
+                    logger.debug("Pipeline stopped early")
+                    return
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _feed(items: Union[Iterable[Any], AsyncIterable[Any]], outbox: asyncio.Queue) -> None:
+        if not isinstance(items, AsyncIterable):
+            for item in items:
+                await outbox.put(item)
+            await outbox.put(_DONE)
+            return
+        try:
+            async for item in items:
+                await outbox.put(item)
+            await outbox.put(_DONE)
+        finally:
+            # Release what the source holds (e.g. an OpenSearch point in time) when the run stops early
+            aclose = getattr(items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    @staticmethod
+    async def _run_stage(stage: Stage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]) -> None:
+        async def work() -> None:
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    # Put the marker back so sibling workers stop as well
+                    await inbox.put(_DONE)
+                    return
+                result = await stage.worker(item)
+                if outbox is not None and result is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(work() for _ in range(max(1, stage.concurrency))))
+        logger.debug(f"Pipeline stage '{stage.name}' finished")
+        if outbox is not None:
+            await outbox.put(_DONE)
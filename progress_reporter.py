@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class ProgressReporter:
+    """Keeps a single status message per question up to date.
+
+    Each stage sets its own status line by key. Updates are coalesced and the
+    message is edited at most once per `min_interval` seconds, so a question
+    costs a handful of Bot API calls instead of one per stage and document.
+    """
+    def __init__(self, bot: Bot, telegram_chat_id: int, min_interval: float = settings.progress_edit_interval):
+        self.bot = bot
+        self.telegram_chat_id = telegram_chat_id
+        self.min_interval = min_interval
+        self._lines: Dict[str, str] = {}
+        self._message_id: Optional[int] = None
+        self._sent_text = ""
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def update(self, key: str, text: str) -> None:
+        """Set the status line for `key` and schedule a coalesced edit."""
+        self._lines[key] = text
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def close(self) -> None:
+        """Cancel the pending edit and write the latest state right away. Never raises."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # Progress is best effort; it must not hide the outcome of the question
+            logger.warning(f"Final progress update failed: {str(e)}")
+
+    def _render(self) -> str:
+        text = "\n".join(self._lines.values())
+        if len(text) > TELEGRAM_MESSAGE_LIMIT:
+            # Keep the newest lines, they carry the current state
+            text = "…" + text[-(TELEGRAM_MESSAGE_LIMIT - 1):]
+        return text
+
+    async def _delayed_flush(self) -> None:
+        # Keep going until the message shows the latest lines, updates may arrive while we wait
+        try:
+            while self._render() != self._sent_text:
+                delay = self._last_edit + self.min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.flush()
+        except Exception as e:
+            # Nobody awaits this task; the next update schedules another attempt
+            logger.warning(f"Progress update failed: {str(e)}")
+
+    async def flush(self) -> None:
+        """Send or edit the status message if its text changed."""
+        async with self._lock:
+            text = self._render()
+            if not text or text == self._sent_text:
+                return
+            try:
+                if self._message_id is None:
+                    msg = await self.bot.send_message(chat_id=self.telegram_chat_id, text=text)
+                    self._message_id = msg.message_id
+                else:
+                    await self.bot.edit_message_text(
+                        chat_id=self.telegram_chat_id,
+                        message_id=self._message_id,
+                        text=text
+                    )
+                self._sent_text = text
+            except TelegramRetryAfter as e:
+                # Flood control: try again once Telegram allows it
+                logger.warning(f"Progress update throttled by Telegram for {e.retry_after}s")
+                self._last_edit = time.monotonic() + e.retry_after
+                return
+            except TelegramBadRequest as e:
+                # Do not retry the same text, it would be rejected again
+                logger.warning(f"Progress update rejected: {str(e)}")
+                self._sent_text = text
+            self._last_edit = time.monotonic()
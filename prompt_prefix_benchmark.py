@@ -0,0 +1,82 @@
+# USAGE:
+# python prompt_prefix_benchmark.py
+#
+# Measures Ollama prefill for the query constructor, retrieval grader and
+# answerer prompts. Each prompt is sent as is ("static prefix first") and with
+# the per-request text moved in front of it ("variable first", the old layout),
+# which stops Ollama from reusing the KV cache of the previous request.
+import asyncio
+import statistics
+from typing import Any, Callable, Dict, List
+
+from langchain_ollama import ChatOllama
+
+from answerer import Answerer
+from opensearch_query_constructor import OpenSearchQueryConstructor
+from opensearch_retrieval_grader import OpenSearchRetrievalGrader
+
+QUESTIONS = [
+    "What are crm errors in prod today?",
+    "What happened with order PSV-745559?",
+    "What are warnings in test last 3 hours?",
+    "What are Mindbox upload errors this week?",
+    "What is wrong with item NM0086817?",
+]
+DOCUMENT = "level: error, ns: prod, svc: crm-service, msg: Failed to upload order PSV-745559 to Mindbox: 503"
+
+
+async def measure(llm: ChatOllama, prompt: str) -> Dict[str, float]:
+    """Send the prompt, generating a single token, and return Ollama's prefill stats."""
+    message = await llm.bind(options={"num_ctx": llm.num_ctx, "temperature": 0, "num_predict": 1}).ainvoke(prompt)
+    metadata = message.response_metadata
+    return {
+        "tokens": metadata.get("prompt_eval_count") or 0,
+        "ms": (metadata.get("prompt_eval_duration") or 0) / 1e6,
+    }
+
+
+async def run_layout(llm: ChatOllama, render: Callable[[str], str], variable_first: bool) -> List[Dict[str, float]]:
+    results = []
+    for question in QUESTIONS:
+        prompt = render(question)
+        if variable_first:
+            prompt = f"Request: {question}\n{prompt}"
+        results.append(await measure(llm, prompt))
+    # The first request only fills the cache
+    return results[1:]
+
+
+def report(name: str, layout: str, results: List[Dict[str, float]]) -> None:
+    tokens = statistics.mean(r["tokens"] for r in results)
+    ms = statistics.mean(r["ms"] for r in results)
+    print(f"{name:<18} {layout:<22} {tokens:>10.0f} {ms:>12.1f}")
+
+
+async def main():
+    constructor = OpenSearchQueryConstructor()
+    grader = OpenSearchRetrievalGrader()
+    answerer = Answerer()
+
+    components: Dict[str, Any] = {
+        "query constructor": (
+            constructor.llm,
+            lambda q: constructor.prompt.format(examples=constructor._format_examples(q), question=q)
+        ),
+        "retrieval grader": (
+            grader._llm,
+            lambda q: grader._prompt.format(question=q, document=DOCUMENT)
+        ),
+        "answerer": (
+            answerer._llm,
+            lambda q: answerer._prompt.format(question=q, context=DOCUMENT, stack_trace="", code_context="")
+        ),
+    }
+
+    print(f"{'component':<18} {'layout':<22} {'prefill tok':>10} {'prefill ms':>12}")
+    for name, (llm, render) in components.items():
+        for layout, variable_first in (("variable first", True), ("static prefix first", False)):
+            report(name, layout, await run_layout(llm, render, variable_first))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+import time
+from typing import Any, Dict
+
+from langchain_core.runnables import Runnable
+
+
+async def prefill(runnable: Runnable, inputs: Dict[str, Any]) -> float:
+    """Send a prompt and stop at the first generated chunk.
+
+    Ollama evaluates the whole prompt before it emits the first token, so this
+    loads the model and leaves the prompt in its KV cache for the next request
+    that starts with the same text. Returns the elapsed seconds.
+    """
+    start = time.perf_counter()
+    chunks = runnable.astream(inputs)
+    try:
+        async for _ in chunks:
+            break
+    finally:
+        # Closing the stream ends the request instead of generating the rest of the answer
+        await chunks.aclose()
+    return time.perf_counter() - start
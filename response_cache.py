@@ -0,0 +1,57 @@
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, List, Optional
+
+from config import settings
+from date_math import floor_time, resolve_time_range
+from ttl_cache import TTLCache
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case the question and collapse whitespace and trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class ResponseCache:
+    """Caches the answers sent for a question, keyed on the question and its time window.
+
+    Relative windows such as "last hour" are resolved to concrete bounds and
+    rounded down to `granularity_seconds`, so the same question asked a few
+    seconds apart maps to the same entry while a later "last hour" does not.
+    """
+    def __init__(
+        self,
+        max_entries: int = settings.response_cache_max_entries,
+        ttl_seconds: float = settings.response_cache_ttl_seconds,
+        granularity_seconds: int = settings.response_cache_time_granularity_seconds
+    ):
+        self.granularity_seconds = granularity_seconds
+        self._cache = TTLCache(max_entries, ttl_seconds)
+
+    def key(self, question: str, opensearch_query: Dict[str, Any], now: Optional[datetime] = None) -> Hashable:
+        """Build the cache key for a question and its translated query."""
+        now = now or datetime.now(timezone.utc)
+        try:
+            time_range = resolve_time_range(opensearch_query, now)
+        except ValueError:
+            # Unparseable date math: fall back to the raw range, it is still deterministic
+            time_range = json.dumps(opensearch_query, sort_keys=True)
+        if isinstance(time_range, tuple):
+            time_range = tuple(
+                floor_time(bound, self.granularity_seconds).isoformat() if bound else None
+                for bound in time_range
+            )
+        return normalize_question(question), time_range
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Return the stored response: {"answers": [...], "result": str or None}."""
+        return self._cache.get(key)
+
+    def set(self, key: Hashable, answers: List[str], result: Optional[str] = None) -> None:
+        """Store the answers sent for a question and the final status, if any."""
+        self._cache.set(key, {"answers": list(answers), "result": result})
+
+    def stats(self) -> dict:
+        return self._cache.stats()
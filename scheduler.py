@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict
+
+from aiogram import Bot
+
+from config import settings
+from workflow import ChatChain
+
+logger = logging.getLogger(__name__)
+
+
+class RequestScheduler:
+    """Schedules incoming questions between the Telegram handlers and ChatChain.
+
+    Every chat gets its own FIFO queue, so questions of one chat are answered
+    one after another while different chats run side by side. The number of
+    LLM calls in flight across all chats is capped by `ChatChain.llm_slots`.
+    With `cancel_previous` enabled, a new question from a chat cancels the
+    question that chat is still waiting for.
+    """
+    def __init__(self, bot: Bot, chat_chain: ChatChain, cancel_previous: bool = settings.scheduler_cancel_previous):
+        self.bot = bot
+        self.chat_chain = chat_chain
+        self.cancel_previous = cancel_previous
+        self._pending: Dict[int, Deque[str]] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    async def submit(self, telegram_chat_id: int, question: str) -> None:
+        """Queue a question for the chat and start the chat worker if needed."""
+        pending = self._pending.setdefault(telegram_chat_id, deque())
+        running = self._running.get(telegram_chat_id)
+
+        cancelled = 0
+        if self.cancel_previous:
+            cancelled = len(pending)
+            pending.clear()
+            if running is not None and not running.done():
+                running.cancel()
+                cancelled += 1
+                running = None
+
+        pending.append(question)
+        ahead = len(pending) - 1 + (1 if running is not None else 0)
+        if telegram_chat_id not in self._workers:
+            self._workers[telegram_chat_id] = asyncio.create_task(self._drain(telegram_chat_id))
+
+        # Notify only after the queue is updated, so a worker finishing meanwhile can't lose the question
+        if cancelled:
+            await self.bot.send_message(
+                chat_id=telegram_chat_id,
+                text=f"⛔ Cancelled {cancelled} previous question(s), answering the new one..."
+            )
+        if ahead:
+            await self.bot.send_message(
+                chat_id=telegram_chat_id,
+                text=f"⏳ Your question is queued, position {ahead + 1} ({ahead} ahead of it)"
+            )
+
+    async def _drain(self, telegram_chat_id: int) -> None:
+        """Process the chat's questions one by one until its queue is empty."""
+        pending = self._pending[telegram_chat_id]
+        try:
+            while pending:
+                question = pending.popleft()
+                task = asyncio.create_task(self.chat_chain.process_message(telegram_chat_id, question))
+                self._running[telegram_chat_id] = task
+                try:
+                    # asyncio.wait does not propagate the task's own cancellation
+                    await asyncio.wait({task})
+                finally:
+                    del self._running[telegram_chat_id]
+                    task.cancel()
+
+                if task.cancelled():
+                    logger.info(f"Question cancelled for chat {telegram_chat_id}: {question}")
+                elif task.exception() is not None:
+                    e = task.exception()
+                    logger.error(f"Error processing message: {str(e)}")
+                    await self.bot.send_message(
+                        chat_id=telegram_chat_id,
+                        text=f"Sorry, I encountered an error: {str(e)}"
+                    )
+        finally:
+            del self._workers[telegram_chat_id]
+            if not pending:
+                del self._pending[telegram_chat_id]
+
+    async def close(self) -> None:
+        """Cancel all queued and running questions."""
+        for pending in self._pending.values():
+            pending.clear()
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,75 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from config import settings
+from date_math import resolve_time_range
+from ttl_cache import TTLCache
+
+# Logs arrive with some delay, so a range is only final this long after its end
+LATE_LOG_SECONDS = 300
+
+
+def fingerprint(request: Dict[str, Any]) -> str:
+    """A short stable hash of a search request."""
+    return hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def estimate_size(docs: List[Document]) -> int:
+    """Rough size of the documents in bytes, to cap the memory of the cache."""
+    return sum(len(doc.page_content) + len(json.dumps(doc.metadata, default=str)) for doc in docs)
+
+
+class SearchResultCache:
+    """Caches the documents of OpenSearch searches in process, keyed on the search request.
+
+    The hits of a range that ended more than LATE_LOG_SECONDS ago no longer
+    change and are kept for `historical_ttl_seconds`; ranges reaching up to
+    now expire after `recent_ttl_seconds`. Callers get copies, so they may
+    change the documents freely.
+    """
+    def __init__(
+        self,
+        recent_ttl_seconds: float = settings.opensearch_result_cache_recent_ttl_seconds,
+        historical_ttl_seconds: float = settings.opensearch_result_cache_historical_ttl_seconds,
+        max_entries: int = settings.opensearch_result_cache_max_entries,
+        max_megabytes: float = settings.opensearch_result_cache_max_megabytes
+    ):
+        self.recent_ttl_seconds = recent_ttl_seconds
+        self.historical_ttl_seconds = historical_ttl_seconds
+        self._cache = TTLCache(max_entries, recent_ttl_seconds, max_weight=max_megabytes * 1024 * 1024)
+
+    @staticmethod
+    def key(index: str, body: Dict[str, Any]) -> str:
+        """Build the cache key for a search request."""
+        return fingerprint({"index": index, "body": body})
+
+    def ttl(self, opensearch_query: Dict[str, Any], now: Optional[datetime] = None) -> float:
+        """How long the hits of a query stay valid, depending on how recent its time range is."""
+        now = now or datetime.now(timezone.utc)
+        try:
+            time_range = resolve_time_range(opensearch_query, now)
+        except ValueError:
+            time_range = None
+        if time_range is not None and time_range[1] <= now - timedelta(seconds=LATE_LOG_SECONDS):
+            return self.historical_ttl_seconds
+        return self.recent_ttl_seconds
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        """Return copies of the cached documents, or None."""
+        docs = self._cache.get(key)
+        if docs is None:
+            return None
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+
+    def set(self, key: str, opensearch_query: Dict[str, Any], docs: List[Document]) -> None:
+        """Store copies of the documents found for a query."""
+        docs = [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+        self._cache.set(key, docs, ttl_seconds=self.ttl(opensearch_query), weight=estimate_size(docs))
+
+    def stats(self) -> dict:
+        """Size, memory estimate in bytes and hit/miss counters."""
+        return self._cache.stats()
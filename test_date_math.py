@@ -0,0 +1,35 @@
+# USAGE:
+# pytest test_date_math.py
+
+from datetime import datetime, timezone
+from date_math import pin_relative_bounds
+
+NOW = datetime(2025, 2, 19, 21, 18, 41, tzinfo=timezone.utc)
+
+
+def test_pin_relative_bounds_rounds_outwards():
+    query = {
+        "bool": {
+            "filter": [
+                {"term": {"ns": "prod"}},
+                {"range": {"time": {"gte": "now-1h", "lte": "now", "time_zone": "+03:00"}}},
+            ]
+        }
+    }
+    pinned = pin_relative_bounds(query, NOW, 60)
+
+    assert pinned["bool"]["filter"][0] == {"term": {"ns": "prod"}}
+    assert pinned["bool"]["filter"][1]["range"]["time"] == {
+        "gte": "2025-02-19T20:18:00Z", "lte": "2025-02-19T21:19:00Z", "time_zone": "+03:00"
+    }
+    # Requests a few seconds apart are identical
+    assert pin_relative_bounds(query, NOW.replace(second=59), 60) == pinned
+    assert query["bool"]["filter"][1]["range"]["time"]["gte"] == "now-1h"
+
+
+def test_pin_relative_bounds_keeps_absolute_bounds():
+    query = {"range": {"time": {"gte": "2025-02-19T10:00:00", "lte": "now/d", "time_zone": "+03:00"}}}
+
+    assert pin_relative_bounds(query, NOW, 60)["range"]["time"] == {
+        "gte": "2025-02-19T10:00:00", "lte": "2025-02-20T21:00:00Z", "time_zone": "+03:00"
+    }
@@ -0,0 +1,22 @@
+# USAGE:
+# pytest test_example_selector.py
+
+from example_selector import BM25ExampleSelector, tokenize
+
+EXAMPLES = [
+    ("What are warnings in prod this week?", {"bool": {"filter": [{"term": {"level": "warn"}}]}}),
+    ("What happened with order PSV-745559?", {"bool": {"must": [{"term": {"msg": "PSV-745559"}}]}}),
+    ("What are logs from 16:00:00 to now?", {"bool": {"filter": [{"range": {"time": {"gte": "now/d+16h"}}}]}}),
+]
+
+
+def test_tokenize_reduces_values_to_their_shape():
+    assert tokenize("Order PSV-737844 on 2025-03-20 at 10:00") == ["order", "id", "on", "date", "at", "clock"]
+
+
+def test_select_ranks_examples_of_the_same_shape_first():
+    selector = BM25ExampleSelector(EXAMPLES, k=1)
+    assert selector.select("What is wrong with order NM0086817?") == [1]
+    assert selector.select("logs from 09:30 to now") == [2]
+    assert "PSV-745559" in selector.format("What happened with order PSV-111111?")
+    assert "PSV-745559" not in selector.format("warnings this week")
@@ -0,0 +1,80 @@
+# USAGE:
+# pytest test_index_resolver.py
+
+from datetime import date, datetime, timezone
+from index_resolver import IndexResolver, find_terms
+
+NOW = datetime(2025, 2, 19, 21, 30, tzinfo=timezone.utc)
+LISTING = (date(2025, 2, 19), {
+    "bus-prod-info-02-17", "bus-prod-info-02-18", "bus-prod-info-02-19",
+    "bus-test-info-02-18", "bus-test-info-02-19",
+})
+
+
+def _resolver(base_pattern="bus-*-info-*"):
+    return IndexResolver(
+        pattern="bus-{ns}-info-{date}", date_format="%m-%d", time_zone="+00:00", max_indices=31, ttl_seconds=60,
+        base_pattern=base_pattern
+    )
+
+
+def _query(ns_clause, time_range):
+    return {"bool": {"filter": [ns_clause, {"range": {"time": time_range}}]}}
+
+
+def test_find_terms_ignores_must_not():
+    query = {"bool": {"filter": [{"terms": {"ns": ["prod", "test"]}}], "must_not": [{"term": {"ns": "dev"}}]}}
+
+    assert find_terms(query, "ns") == ["prod", "test"]
+
+
+def test_resolve_picks_the_days_and_family_of_the_query():
+    resolver = _resolver()
+
+    assert resolver.resolve(_query({"term": {"ns": "prod"}}, {"gte": "now-1h"}), LISTING, NOW) == "bus-prod-info-02-19"
+    assert resolver.resolve(_query({"term": {"ns": "test"}}, {"gte": "now-2d"}), LISTING, NOW) == (
+        "bus-test-info-02-18,bus-test-info-02-19"
+    )
+    # Without an ns filter every family of those days within the configured index is searched
+    query = {"bool": {"filter": [{"range": {"time": {"gte": "2025-02-18T00:00:00", "lte": "2025-02-18T23:59:59"}}}]}}
+    assert resolver.resolve(query, LISTING, NOW) == "bus-prod-info-02-18,bus-test-info-02-18"
+
+
+def test_resolve_without_ns_stays_within_the_configured_index():
+    resolver = _resolver(base_pattern="bus-prod-info-*")
+    query = {"bool": {"filter": [{"range": {"time": {"gte": "2025-02-18T00:00:00", "lte": "2025-02-18T23:59:59"}}}]}}
+
+    assert resolver.resolve(query, LISTING, NOW) == "bus-prod-info-02-18"
+    # Days after the index list was read cannot be narrowed down, so the configured pattern is searched
+    tomorrow = datetime(2025, 2, 20, 0, 30, tzinfo=timezone.utc)
+    assert resolver.resolve({"bool": {"filter": [{"range": {"time": {"gte": "now-1h"}}}]}}, LISTING, tomorrow) is None
+
+
+def test_resolve_falls_back_to_wildcards():
+    resolver = _resolver()
+
+    # A day after the index list was read may already have its index
+    tomorrow = datetime(2025, 2, 20, 0, 30, tzinfo=timezone.utc)
+    assert resolver.resolve(_query({"term": {"ns": "prod"}}, {"gte": "now-1h"}), LISTING, tomorrow) == (
+        "bus-prod-info-02-19,bus-prod-info-02-20*"
+    )
+    # No lower bound, or no index list: the whole family
+    assert resolver.resolve(_query({"term": {"ns": "prod"}}, {"lte": "now"}), LISTING, NOW) == "bus-prod-info-*"
+    assert resolver.resolve(_query({"term": {"ns": "prod"}}, {"gte": "now-1h"}), None, NOW) == "bus-prod-info-*"
+    assert resolver.resolve({"bool": {"must": [{"match": {"msg": "timeout"}}]}}, LISTING, NOW) is None
+
+
+def test_resolve_finds_nothing_for_days_without_indices():
+    resolver = _resolver()
+    query = {"bool": {"filter": [{"range": {"time": {"gte": "2025-02-10T00:00:00", "lte": "2025-02-12T23:59:59"}}}]}}
+
+    assert resolver.resolve(query, LISTING, NOW) == ""
+
+
+def test_failed_listing_is_not_retried_at_once():
+    resolver = _resolver()
+    assert not resolver.listing_failed()
+    resolver.remember_failure()
+
+    assert resolver.listing_failed()
+    assert resolver.known_indices() is None
@@ -0,0 +1,41 @@
+# USAGE:
+# pytest test_log_aggregations.py
+
+from datetime import datetime, timezone
+
+import pytest
+
+from log_aggregations import AggregationRequest, auto_interval, detect_aggregation, format_aggregation
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many errors in prod today, by service?", AggregationRequest(group_by=["svc"])),
+    ("Which services have most warnings this week?", AggregationRequest(group_by=["svc"])),
+    ("Errors per hour in prod today", AggregationRequest(interval="1h")),
+    ("What is the trend of crm errors this month?", AggregationRequest(interval="auto")),
+    ("What happened with order PSV-745559?", None),
+    ("What are crm errors in prod today?", None),
+])
+def test_detect_aggregation(question, expected):
+    assert detect_aggregation(question) == expected
+
+
+def test_auto_interval_follows_time_range():
+    now = datetime(2025, 4, 11, 12, 0, tzinfo=timezone.utc)
+    assert auto_interval({"range": {"time": {"gte": "now-1d"}}}, now) == "1h"
+    assert auto_interval({"range": {"time": {"gte": "now-1M"}}}, now) == "1d"
+
+
+def test_format_aggregation():
+    response = {
+        "hits": {"total": {"value": 42, "relation": "eq"}},
+        "aggregations": {
+            "by_svc": {"sum_other_doc_count": 2, "buckets": [{"key": "crm", "doc_count": 40}]},
+            "over_time": {"buckets": [{"key_as_string": "2025-04-11 10:00", "doc_count": 42}]},
+        },
+    }
+    assert format_aggregation(response) == (
+        "Total matching log entries: 42\n"
+        "\nCount by svc:\n- crm: 40\n- (other): 2\n"
+        "\nCount over time (+03:00):\n- 2025-04-11 10:00: 42"
+    )
@@ -0,0 +1,88 @@
+# USAGE:
+# pytest test_log_clusterer.py
+
+from langchain_core.documents import Document
+from log_clusterer import DocumentClusterer, cluster_documents, format_occurrences, mask_message
+
+
+def _doc(msg, time, level="error", ns="prod"):
+    return Document(page_content=msg, metadata={"level": level, "ns": ns, "svc": None, "time": time})
+
+
+def test_mask_message_masks_variable_tokens():
+    msg = (
+        "Action realization.orders.generator.takeKeys error with payload: {\"limit\":30}, "
+        "error: RequestTimeoutError: Request is timed out when call 'realization.orders.generator.takeKeys' "
+        "action on 'esb-realization-orders-generator-7b9b8b9f94-7kx6n-19' node."
+    )
+    template, ids = mask_message(msg)
+
+    assert "<HOST>" in template
+    assert "\"limit\":<NUM>" in template
+    assert "realization.orders.generator.takeKeys" in template
+    assert ids == set()
+
+
+def test_mask_message_collects_business_ids():
+    template, ids = mask_message("What is wrong with order PSV-737844-К0015742 and item NM0098877?")
+
+    assert template == "What is wrong with order <ID> and item <ID>?"
+    assert ids == {"PSV-737844-К0015742", "NM0098877"}
+
+
+def test_mask_message_keeps_topic_names():
+    template, _ = mask_message("Mindbox upload server error in topic id-authorize-customer-topic")
+
+    assert "id-authorize-customer-topic" in template
+
+
+def test_cluster_documents_groups_repeated_messages():
+    docs = [
+        _doc("Order PSV-745559 upload failed after 3 retries", "2025-02-19T21:18:01.919Z"),
+        _doc("Redis-pub errorread ETIMEDOUT", "2025-02-19T21:21:03.086Z"),
+        _doc("Order PSV-745560 upload failed after 5 retries", "2025-02-19T21:22:00.000Z"),
+        _doc("Order PSV-745561 upload failed after 3 retries", "2025-02-19T21:23:00.000Z", ns="test"),
+    ]
+    clusters = cluster_documents(docs)
+
+    assert len(clusters) == 3
+    first = clusters[0]
+    assert first.page_content == docs[0].page_content
+    assert first.metadata["occurrences"] == [
+        {"time": "2025-02-19T21:18:01.919Z", "ids": ["PSV-745559"]},
+        {"time": "2025-02-19T21:22:00.000Z", "ids": ["PSV-745560"]},
+    ]
+
+    description = format_occurrences(first)
+    assert "occurred 2 times" in description
+    assert "PSV-745560" in description
+    assert format_occurrences(clusters[1]) == ""
+
+
+def test_collapsed_counts_add_up_when_clustered():
+    docs = [
+        _doc("Order PSV-745559 upload failed after 3 retries", "2025-02-19T21:18:01.919Z"),
+        _doc("Order PSV-745560 upload failed after 5 retries", "2025-02-19T21:22:00.000Z"),
+    ]
+    docs[0].metadata.update(occurrence_count=40, first_seen="2025-02-19T08:00:00.000Z", last_seen="2025-02-19T21:18:01.919Z")
+    docs[1].metadata.update(occurrence_count=2, first_seen="2025-02-19T21:20:00.000Z", last_seen="2025-02-19T22:00:00.000Z")
+    clusters = cluster_documents(docs)
+
+    assert len(clusters) == 1
+    assert clusters[0].metadata["occurrence_count"] == 42
+    assert clusters[0].metadata["first_seen"] == "2025-02-19T08:00:00.000Z"
+    assert clusters[0].metadata["last_seen"] == "2025-02-19T22:00:00.000Z"
+    assert "occurred 42 times from 2025-02-19T08:00:00.000Z to 2025-02-19T22:00:00.000Z" in format_occurrences(clusters[0])
+
+
+def test_occurrences_beyond_the_limit_are_only_counted():
+    clusterer = DocumentClusterer(max_occurrences=3)
+    for i in range(10):
+        clusterer.add(_doc(f"Order PSV-74555{i} upload failed", f"2025-02-19T21:0{i}:00.000Z"))
+    cluster = list(clusterer.clusters.values())[0]
+
+    assert len(cluster.metadata["occurrences"]) == 3
+    assert cluster.metadata["occurrence_count"] == 10
+    description = format_occurrences(cluster)
+    assert "occurred 10 times" in description
+    assert "Occurrences (3 of 10 listed):" in description
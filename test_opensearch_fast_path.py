@@ -0,0 +1,58 @@
+# USAGE:
+# pytest test_opensearch_fast_path.py
+
+import pytest
+
+import test_opensearch_query_constructor as constructor_suite
+from opensearch_fast_path import RuleBasedQueryTranslator
+
+
+class FastPathConstructor:
+    """Stands in for OpenSearchQueryConstructor, answering only from the fast path."""
+    def __init__(self):
+        self.translator = RuleBasedQueryTranslator()
+
+    def construct_query(self, question):
+        result = self.translator.translate(question)
+        assert result is not None and result.confident, f"fast path is not confident about: {question}"
+        return result.query
+
+
+CONSTRUCTOR_TESTS = [
+    getattr(constructor_suite, name) for name in dir(constructor_suite) if name.startswith("test_")
+]
+
+
+@pytest.mark.parametrize("case", CONSTRUCTOR_TESTS, ids=lambda case: case.__name__)
+def test_fast_path_passes_constructor_suite(case):
+    case(FastPathConstructor())
+
+
+@pytest.mark.parametrize("question", [
+    "Why is the payment gateway slow after the last deploy?",
+    "Summarize what went wrong",
+    "Show not errors in prod for the last hour",
+    "What are the latest errors in prod?",
+])
+def test_fast_path_defers_to_llm(question):
+    result = RuleBasedQueryTranslator().translate(question)
+    assert result is None or not result.confident
+
+
+def test_time_of_day_range():
+    result = RuleBasedQueryTranslator().translate("What are logs on prod from 16:35:11 to 16:36:56?")
+    assert result.query == {
+        "bool": {
+            "filter": [
+                {"term": {"ns": "prod"}},
+                {"range": {"time": {"gte": "now/d+16h35m11s", "lte": "now/d+16h36m56s", "time_zone": "+03:00"}}}
+            ]
+        }
+    }
+
+
+@pytest.mark.parametrize("question", ["How many errors in prod today?", "What errors in prod today?"])
+def test_unsure_guess_has_no_question_words_in_subject(question):
+    result = RuleBasedQueryTranslator().translate(question)
+    assert not result.confident
+    assert "must" not in result.query["bool"]
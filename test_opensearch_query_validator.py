@@ -0,0 +1,52 @@
+# USAGE:
+# pytest test_opensearch_query_validator.py
+
+import pytest
+
+from opensearch_query_validator import InvalidQueryError, OpenSearchQueryValidator, split_date_math
+
+
+def test_split_date_math():
+    assert split_date_math("now/d+16h35m11s") == "now/d+16h+35m+11s"
+    assert split_date_math("now-1h") == "now-1h"
+
+
+def test_repair_moves_clauses_and_adds_time_zone():
+    query = {
+        "bool": {
+            "filter": [
+                {"match": {"message": "crm error"}},
+                {"range": {"time": {"gte": "2025-04-11T00:00:00", "lte": "2025-04-11T23:59:59"}}}
+            ],
+            "must": [{"match": {"level": "Warning"}}]
+        }
+    }
+    repaired, repairs = OpenSearchQueryValidator().repair(query)
+    assert repaired == {
+        "bool": {
+            "filter": [
+                {"range": {"time": {"gte": "2025-04-11T00:00:00", "lte": "2025-04-11T23:59:59", "time_zone": "+03:00"}}},
+                {"term": {"level": "warn"}}
+            ],
+            "must": [{"match": {"msg": "crm error"}}]
+        }
+    }
+    assert repairs
+
+
+def test_unbounded_query_is_capped_or_rejected():
+    query = {"bool": {"must": [{"term": {"msg": "PSV-745559"}}]}}
+    repaired, _ = OpenSearchQueryValidator(default_window="7d").repair(query)
+    assert repaired["bool"]["filter"] == [{"range": {"time": {"gte": "now-7d"}}}]
+    with pytest.raises(InvalidQueryError):
+        OpenSearchQueryValidator(default_window="").repair(query)
+
+
+@pytest.mark.parametrize("query", [
+    {"bool": {"filter": [{"term": {"host": "node-1"}}]}},
+    {"bool": {"filter": [{"range": {"time": {"gte": "yesterday"}}}]}},
+    {"bool": {"filter": [{"script": {"source": "true"}}]}},
+])
+def test_unrepairable_queries_are_rejected(query):
+    with pytest.raises(InvalidQueryError):
+        OpenSearchQueryValidator().repair(query)
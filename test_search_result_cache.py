@@ -0,0 +1,43 @@
+# USAGE:
+# pytest test_search_result_cache.py
+
+from datetime import datetime, timezone
+from langchain_core.documents import Document
+from search_result_cache import SearchResultCache, estimate_size
+
+NOW = datetime(2025, 2, 19, 21, 18, 41, tzinfo=timezone.utc)
+
+
+def _docs(*messages):
+    return [Document(page_content=msg, metadata={"level": "error", "time": "2025-02-19T21:18:01.919Z"}) for msg in messages]
+
+
+def test_ttl_depends_on_how_recent_the_range_is():
+    cache = SearchResultCache(recent_ttl_seconds=30, historical_ttl_seconds=3600, max_entries=10, max_megabytes=1)
+    past = {"range": {"time": {"gte": "2025-02-18T00:00:00Z", "lte": "2025-02-18T23:59:59Z"}}}
+    recent = {"range": {"time": {"gte": "2025-02-19T20:18:00Z", "lte": "2025-02-19T21:19:00Z"}}}
+
+    assert cache.ttl(past, NOW) == 3600
+    assert cache.ttl(recent, NOW) == 30
+    assert cache.ttl({"range": {"time": {"gte": "now-1d"}}}, NOW) == 30
+
+
+def test_cache_returns_copies_and_caps_memory():
+    docs = _docs("Redis-pub errorread ETIMEDOUT")
+    cache = SearchResultCache(recent_ttl_seconds=30, historical_ttl_seconds=3600, max_entries=10, max_megabytes=1)
+    query = {"range": {"time": {"gte": "now-1h"}}}
+    key = cache.key("bus-prod-info-02-19", {"query": query, "size": 10})
+
+    assert cache.get(key) is None
+    cache.set(key, query, docs)
+    cached = cache.get(key)
+    cached[0].metadata["occurrences"] = []
+    assert cache.get(key)[0].metadata == docs[0].metadata
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1, "weight": estimate_size(docs)}
+
+    # Older entries make room for new ones once the memory estimate is exceeded
+    big = _docs("x" * 700_000)
+    cache.set("first", query, big)
+    cache.set("second", query, big)
+    assert cache.get("first") is None
+    assert cache.get("second") is not None
@@ -0,0 +1,55 @@
+# USAGE:
+# pytest test_translation_cache.py
+
+import asyncio
+import json
+
+from translation_cache import TranslationCache, normalize_question
+
+QUERY = {"bool": {"filter": [{"term": {"level": "error"}}, {"range": {"time": {"gte": "now-1h"}}}]}}
+
+
+def test_normalize_question_maps_cyrillic_look_alikes():
+    # "crm" typed with a Cyrillic "с", plus extra whitespace
+    assert normalize_question("What are  сrm errors?") == normalize_question("what are crm errors")
+    # IDs mix scripts on purpose: a Latin K is a different order than a Cyrillic К
+    assert normalize_question("order PSV-737844-К0015742") != normalize_question("order PSV-737844-K0015742")
+
+
+def test_cache_survives_restart_and_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "translations.json")
+    cache = TranslationCache(path=path, max_entries=2)
+    cache.set("errors last hour", QUERY)
+    cache.set("warnings last hour", QUERY)
+    assert cache.get("Errors last hour?") == QUERY
+    cache.set("info last hour", QUERY)
+
+    restarted = TranslationCache(path=path, max_entries=2)
+    assert restarted.get("errors last hour") == QUERY
+    assert restarted.get("warnings last hour") is None
+    assert restarted.get("info last hour") == QUERY
+
+
+async def _set_twice_and_wait(cache, path):
+    cache.set("errors last hour", QUERY)
+    cache.set("warnings last hour", QUERY)
+    # Nothing is written inside the event loop step itself
+    assert not path.exists()
+    await asyncio.sleep(0.05)
+
+
+def test_cache_saves_later_in_event_loop(tmp_path):
+    path = tmp_path / "translations.json"
+    cache = TranslationCache(path=str(path), max_entries=10, save_delay=0.01)
+    asyncio.run(_set_twice_and_wait(cache, path))
+
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 2
+
+
+def test_relative_question_with_absolute_translation_is_not_cached():
+    cache = TranslationCache(path=None)
+    absolute = {"bool": {"filter": [{"range": {"time": {"gte": "2025-04-11T00:00:00"}}}]}}
+    cache.set("errors today", absolute)
+    assert cache.get("errors today") is None
+    cache.set("errors on April 11 2025", absolute)
+    assert cache.get("errors on April 11 2025") == absolute
@@ -0,0 +1,145 @@
+# USAGE:
+# python translation_benchmark.py
+# python translation_benchmark.py --strategies fast_path cached --concurrency 8
+#
+# Runs the questions of test_opensearch_query_constructor.py through each
+# translation strategy and checks the results with the same test functions.
+# Reports accuracy, p50/p95 latency and throughput side by side.
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import test_opensearch_query_constructor as constructor_suite
+from config import settings
+from opensearch_query_constructor import OpenSearchQueryConstructor
+from translation_cache import TranslationCache
+
+Translate = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+TEST_CASES = [getattr(constructor_suite, name) for name in dir(constructor_suite) if name.startswith("test_")]
+
+
+class _Recorded(Exception):
+    pass
+
+
+class QuestionRecorder:
+    """Stands in for the constructor to find out which question a test case asks."""
+    def construct_query(self, question: str) -> Dict[str, Any]:
+        self.question = question
+        raise _Recorded()
+
+
+class ReplayConstructor:
+    """Stands in for the constructor, answering with a translation made beforehand."""
+    def __init__(self, query: Optional[Dict[str, Any]]):
+        self.query = query
+
+    def construct_query(self, question: str) -> Dict[str, Any]:
+        if self.query is None:
+            raise ValueError(f"no translation for: {question}")
+        return self.query
+
+
+def question_of(case: Callable) -> str:
+    recorder = QuestionRecorder()
+    try:
+        case(recorder)
+    except _Recorded:
+        return recorder.question
+    raise RuntimeError(f"{case.__name__} did not ask a question")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def run_strategy(translate: Translate, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """Translate all questions, at most `concurrency` at a time, timing each one."""
+    slots = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = [0.0] * len(questions)
+
+    async def timed(i: int, question: str) -> Optional[Dict[str, Any]]:
+        async with slots:
+            start = time.perf_counter()
+            try:
+                return await translate(question)
+            except Exception as e:
+                print(f"  {question}: {type(e).__name__}: {e}")
+                return None
+            finally:
+                latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    queries = await asyncio.gather(*(timed(i, question) for i, question in enumerate(questions)))
+    return {"queries": queries, "latencies": latencies, "wall": time.perf_counter() - start}
+
+
+def accuracy(queries: List[Optional[Dict[str, Any]]]) -> int:
+    """Count the test cases that pass with the given translations."""
+    passed = 0
+    for case, query in zip(TEST_CASES, queries):
+        try:
+            # The test cases print the expected and actual queries
+            with contextlib.redirect_stdout(io.StringIO()):
+                case(ReplayConstructor(query))
+            passed += 1
+        except Exception:
+            pass
+    return passed
+
+
+async def main(strategies: List[str], concurrency: int):
+    questions = [question_of(case) for case in TEST_CASES]
+    constructor = OpenSearchQueryConstructor()
+    cache = TranslationCache(path=None)
+
+    async def llm(question: str) -> Dict[str, Any]:
+        query = await constructor.allm_translate(question)
+        cache.set(question, query)
+        return query
+
+    async def fast_path(question: str) -> Optional[Dict[str, Any]]:
+        result = constructor.fast_path.translate(question) if constructor.fast_path else None
+        return result.query if result is not None and result.confident else None
+
+    async def cached(question: str) -> Optional[Dict[str, Any]]:
+        # Filled by the llm strategy, or by a warm-up pass when it did not run
+        return cache.get(question)
+
+    # The llm strategy runs first, it fills the cache
+    translators: Dict[str, Translate] = {"llm": llm, "fast_path": fast_path, "cached": cached}
+    strategies = [name for name in translators if name in strategies]
+    if "cached" in strategies and "llm" not in strategies:
+        print("Warming up the cache with the LLM...")
+        await run_strategy(llm, questions, concurrency)
+
+    print(f"{len(questions)} questions, concurrency {concurrency}\n")
+    rows = []
+    for name in strategies:
+        print(f"Running {name}...")
+        result = await run_strategy(translators[name], questions, concurrency)
+        rows.append((name, result))
+
+    print(f"\n{'strategy':<10} {'accuracy':>10} {'answered':>9} {'p50 ms':>10} {'p95 ms':>10} {'q/s':>10}")
+    for name, result in rows:
+        queries, latencies = result["queries"], result["latencies"]
+        answered = sum(query is not None for query in queries)
+        print(
+            f"{name:<10} {accuracy(queries):>6}/{len(queries):<3} {answered:>9} "
+            f"{percentile(latencies, 50) * 1000:>10.2f} {percentile(latencies, 95) * 1000:>10.2f} "
+            f"{len(queries) / result['wall']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare query translation strategies")
+    parser.add_argument("--strategies", nargs="+", default=["llm", "fast_path", "cached"], choices=["llm", "fast_path", "cached"])
+    parser.add_argument("--concurrency", type=int, default=settings.translation_batch_concurrency)
+    args = parser.parse_args()
+    asyncio.run(main(args.strategies, args.concurrency))
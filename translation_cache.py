@@ -0,0 +1,174 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Cyrillic letters that look like Latin ones; users mix them up in IDs and service names
+HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x",
+})
+
+# Questions about a window relative to the current time
+_RELATIVE_TIME = re.compile(r"\b(?:now|today|yesterday|this|last|past|recent|recently|ago)\b")
+_ABSOLUTE_TIME = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _normalize_token(token: str) -> str:
+    # Business IDs mix scripts on purpose (PSV-737844-К0015742), so tokens with digits are kept verbatim
+    if any(char.isdigit() for char in token):
+        return token
+    return token.lower().translate(HOMOGLYPHS)
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case the question, map Cyrillic look-alikes to Latin and collapse whitespace.
+
+    Tokens containing digits, such as business IDs, are left as typed.
+    """
+    question = " ".join(_normalize_token(token) for token in question.split())
+    return question.rstrip("?!. ")
+
+
+def _range_bounds(query: Any):
+    """Yield every bound of every time range in the query."""
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if key == "range" and isinstance(value, dict) and isinstance(value.get("time"), dict):
+                for op in ("gt", "gte", "lt", "lte"):
+                    if isinstance(value["time"].get(op), str):
+                        yield value["time"][op]
+            else:
+                yield from _range_bounds(value)
+    elif isinstance(query, list):
+        for item in query:
+            yield from _range_bounds(item)
+
+
+class TranslationCache:
+    """LRU cache of question -> OpenSearch query translations, saved to a JSON file.
+
+    Queries are stored as translated, so relative windows keep their `now-…`
+    date math and stay correct whenever the entry is reused. A translation
+    that turned a relative question into absolute dates is not stored.
+
+    Inside an event loop, new entries are saved `save_delay` seconds later
+    in a worker thread, so a burst of translations writes the file once;
+    anything still unsaved is written at exit.
+    """
+    def __init__(
+        self,
+        path: Optional[str] = settings.translation_cache_path,
+        max_entries: int = settings.translation_cache_max_entries,
+        save_delay: float = settings.translation_cache_save_delay_seconds
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self._pending_save: Optional[asyncio.Task] = None
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the cached query for the question, or None."""
+        key = normalize_question(question)
+        query = self._entries.get(key)
+        if query is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return json.loads(json.dumps(query))
+
+    def set(self, question: str, query: Dict[str, Any]) -> None:
+        """Store a translation and schedule saving the cache."""
+        if self.max_entries <= 0 or not self.is_cacheable(question, query):
+            return
+        key = normalize_question(question)
+        self._entries[key] = query
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+        self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        if not self.path:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        if self._pending_save is None or self._pending_save.done():
+            self._pending_save = loop.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.save_delay)
+        # Snapshot on the loop, where entries change; write in a thread to keep the loop free
+        entries = list(self._entries.items())
+        self._dirty = False
+        await asyncio.to_thread(self._write, entries)
+
+    def flush(self) -> None:
+        """Save the cache now if it has unsaved entries."""
+        if self._dirty:
+            self.save()
+
+    @staticmethod
+    def is_cacheable(question: str, query: Dict[str, Any]) -> bool:
+        """A relative question must have been translated to `now`-based date math."""
+        if not _RELATIVE_TIME.search(normalize_question(question)):
+            return True
+        return not any(_ABSOLUTE_TIME.match(bound) for bound in _range_bounds(query))
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters."""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable translation cache {self.path}: {e}")
+            return
+        # The file is ordered from least to most recently used
+        for key, query in entries[-self.max_entries:] if self.max_entries > 0 else []:
+            self._entries[key] = query
+        logger.info(f"Loaded {len(self._entries)} cached translations from {self.path}")
+
+    def save(self) -> None:
+        """Write the cache to its file, replacing the previous one atomically."""
+        self._dirty = False
+        self._write(list(self._entries.items()))
+
+    def _write(self, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(f.name, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save translation cache to {self.path}: {e}")
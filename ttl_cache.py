@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after a TTL.
+
+    Hit and miss counters are kept so cache effectiveness can be reported.
+    With `max_weight`, entries are also evicted while the total weight
+    passed to `set` (e.g. an estimated size in bytes) exceeds it.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float, max_weight: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_weight = max_weight
+        self.weight = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None, weight: float = 0.0) -> None:
+        """Store a value, evicting the least recently used entries when full."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value, weight)
+        self.weight += weight
+        while len(self._entries) > self.max_entries or (self.max_weight is not None and self.weight > self.max_weight):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        self.weight -= self._entries.pop(key)[2]
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters."""
+        stats = {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+        if self.max_weight is not None:
+            stats["weight"] = self.weight
+        return stats
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def configure_worker(index: int, workers: int) -> None:
+    """Adjust the settings of worker `index` out of `workers` before anything reads them.
+
+    All workers share one Ollama host, so LLM_MAX_CONCURRENCY is split between
+    them (at least one slot each). Each worker keeps its own translation cache
+    file, so workers do not overwrite each other's entries.
+    """
+    settings.llm_max_concurrency = max(1, settings.llm_max_concurrency // workers)
+    if settings.translation_cache_path:
+        root, ext = os.path.splitext(settings.translation_cache_path)
+        settings.translation_cache_path = f"{root}.worker-{index}{ext}"
+
+
+def run_worker(updates: multiprocessing.Queue, index: int, workers: int) -> None:
+    """Entry point of a worker process: handle the updates forwarded to it."""
+    configure_worker(index, workers)
+    # Imported here so the front process does not build a ChatChain, and after
+    # configure_worker because modules bind settings as defaults when imported
+    from main import TelegramBot
+
+    asyncio.run(TelegramBot().consume(updates))
+
+
+class WebhookServer:
+    """Receives Telegram updates over a webhook and fans them out to worker processes.
+
+    Updates are routed by chat id, so every chat is always handled by the
+    same worker and its messages keep their order. Each worker runs its own
+    TelegramBot with its own event loop, which spreads the work over
+    several cores. Run one server per host to scale out behind a load balancer.
+    """
+    def __init__(self, workers: int = settings.webhook_workers):
+        self.bot = Bot(token=settings.telegram_bot_token)
+        self.dp = Dispatcher()
+        self.dp.update.outer_middleware(self.forward_update)
+        self.dp.startup.register(self.on_startup)
+        self.dp.shutdown.register(self.on_shutdown)
+
+        workers = max(1, workers)
+        if settings.llm_max_concurrency < workers:
+            logger.warning(
+                f"LLM_MAX_CONCURRENCY={settings.llm_max_concurrency} is below WEBHOOK_WORKERS={workers}: "
+                f"every worker still gets one LLM slot, {workers} in total"
+            )
+        context = multiprocessing.get_context("spawn")
+        self.queues: List[multiprocessing.Queue] = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(target=run_worker, args=(queue, i, workers), name=f"bot-worker-{i}", daemon=True)
+            for i, queue in enumerate(self.queues)
+        ]
+
+    async def forward_update(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> None:
+        """Outer middleware: hand the update to the chat's worker instead of handling it here."""
+        chat = data.get("event_chat")
+        key = chat.id if chat is not None else event.update_id
+        self.queues[key % len(self.queues)].put(event.model_dump(mode="json", exclude_unset=True))
+
+    async def on_startup(self) -> None:
+        url = f"{settings.webhook_base_url.rstrip('/')}{settings.webhook_path}"
+        await self.bot.set_webhook(
+            url=url,
+            secret_token=settings.webhook_secret or None,
+            max_connections=settings.webhook_max_connections,
+            allowed_updates=["message"]
+        )
+        logger.info(f"Webhook set to {url} with {len(self.processes)} workers")
+
+    async def on_shutdown(self) -> None:
+        await self.bot.delete_webhook()
+        await self.bot.session.close()
+        for queue in self.queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 30)
+        logger.info("Webhook workers stopped")
+
+    async def run(self) -> None:
+        """Start the workers and serve the webhook until cancelled."""
+        for process in self.processes:
+            process.start()
+
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            secret_token=settings.webhook_secret or None
+        ).register(app, path=settings.webhook_path)
+        setup_application(app, self.dp, bot=self.bot)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port)
+        await site.start()
+        logger.info(f"Listening for webhook updates on {settings.webhook_host}:{settings.webhook_port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
@@ -1,17 +1,37 @@
 import logging
-from typing import Sequence, List
+from typing import AsyncIterator, Optional, Sequence, List, Tuple
 from aiogram import Bot
 from langchain_core.documents import Document
 import asyncio
+from dataclasses import dataclass, field
 
 from config import settings
 from open_search_retriever import OpenSearchRetriever
 from opensearch_retrieval_grader import OpenSearchRetrievalGrader
 from answerer import Answerer
 from code_base_retriever import CodeBaseRetriever
+from pipeline import Pipeline, Stage, StopPipeline
+from deadline import Deadline, DeadlineExceeded
+from progress_reporter import ProgressReporter
+from message_stream import TelegramMessageStream
+from log_clusterer import DocumentClusterer, cluster_documents, format_occurrences
+from context_packer import pack_context, rank_documents
+from response_cache import ResponseCache
+from opensearch_query_validator import InvalidQueryError
+from log_aggregations import AggregationRequest
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class QuestionRun:
+    """Progress of one question through retrieval, grading and answering."""
+    deadline: Deadline
+    answers: List[str] = field(default_factory=list)
+    total_docs: int = 0
+    processed_docs: int = 0
+
+
 class ChatChain:
     """Class to handle chat processing logic."""
     def __init__(self, bot: Bot):
@@ -20,106 +40,286 @@ class ChatChain:
         self.retrieval_grader = OpenSearchRetrievalGrader()
         self.answerer = Answerer()
         self.code_base_retriever = CodeBaseRetriever()
+        # Global cap on in-flight LLM calls, shared by all chats
+        self.llm_slots = asyncio.Semaphore(max(1, settings.llm_max_concurrency))
+        self.response_cache = ResponseCache() if settings.response_cache_enabled else None
+
+    async def awarmup(self) -> None:
+        """Load the models and prefill the static prompt prefixes so first questions skip the prefill."""
+        components = {
+            "query constructor": self.opensearch_retriever,
+            "retrieval grader": self.retrieval_grader,
+            "answerer": self.answerer,
+        }
+        results = await asyncio.gather(
+            *(component.awarmup() for component in components.values()),
+            return_exceptions=True
+        )
+        for name, result in zip(components, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up of the {name} failed: {result}")
+            else:
+                logger.info(f"Warmed up the {name} in {result:.2f}s")
 
     async def process_message(self, telegram_chat_id: int, question: str) -> None:
         """Main processing function that handles the entire workflow."""
-        # Step 1: Retrieve documents
-        documents = await self.retrieve_opensearch_documents(telegram_chat_id, question)
-        
-        if not documents:
-            await self.bot.send_message(
-                chat_id=telegram_chat_id,
-                text="No documents found for your question."
-            )
+        progress = ProgressReporter(self.bot, telegram_chat_id)
+        try:
+            await self._process_message(telegram_chat_id, question, progress)
+        finally:
+            await progress.close()
+
+    async def _process_message(self, telegram_chat_id: int, question: str, progress: ProgressReporter) -> None:
+        deadline = Deadline(settings.question_deadline_seconds)
+
+        # Step 1: Translate the question; identical questions over the same time window are answered from cache
+        try:
+            opensearch_query, search = await self.translate_question(question, progress, deadline)
+        except DeadlineExceeded:
+            progress.update("result", "⏱ Time limit reached before the question could be translated.")
             return
-        
-        # Step 2: Process each document
-        relevant_docs_found = False
-        for i, doc in enumerate(documents, 1):
-            # Check relevance
-            is_relevant = await self._grade_single_document(question, doc)
-            
-            if not is_relevant:
-                await self.bot.send_message(
-                    chat_id=telegram_chat_id,
-                    text=f"📄 Document {i}/{len(documents)} is not relevant to your question, skipping..."
-                )
-                continue
+        except InvalidQueryError as e:
+            progress.update("result", f"⚠️ Could not build a valid search for this question ({e}), please rephrase it.")
+            return
+
+        try:
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = self.response_cache.key(question, opensearch_query)
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    await self.replay_cached_response(telegram_chat_id, cached, progress)
+                    return
+
+            run = QuestionRun(deadline)
+            try:
+                result = await self._answer_question(telegram_chat_id, question, opensearch_query, progress, run, search)
+            except DeadlineExceeded:
+                # Partial results are not cached
+                unprocessed = run.total_docs - run.processed_docs
+                progress.update("result", f"⏱ Time limit reached: {unprocessed} of {run.total_docs} documents were left unprocessed.")
+                return
+            if result:
+                progress.update("result", result)
+
+            # Only complete runs get here, cancelled or failed questions are never cached
+            if cache_key is not None:
+                self.response_cache.set(cache_key, run.answers, result)
+        finally:
+            # The search started during translation is not needed when the question ended another way
+            if search is not None and not search.done():
+                search.cancel()
+
+    async def _answer_question(self, telegram_chat_id: int, question: str, opensearch_query: dict, progress: ProgressReporter, run: QuestionRun, search: Optional[asyncio.Task] = None) -> Optional[str]:
+        """Retrieve, grade and answer, recording progress in `run`.
+
+        Stops early once `settings.max_answered_documents` documents are answered.
+
+        Returns:
+            A final status for the user when not every document was answered, otherwise None
+        """
+        deadline = run.deadline
+
+        # Counting and trend questions are answered from server-side aggregations, not from raw hits
+        if settings.aggregation_mode_enabled:
+            aggregation = self.opensearch_retriever.aggregation_request(question)
+            if aggregation is not None:
+                run.answers.append(await self.generate_and_send_aggregation_answer(telegram_chat_id, question, opensearch_query, aggregation, progress, deadline))
+                return None
+
+        # Step 2: Retrieve documents, either all at once or page by page as the pipeline consumes them
+        if settings.opensearch_streaming_enabled:
+            items = self.stream_opensearch_documents(opensearch_query, progress, run)
+        else:
+            documents = await self.retrieve_opensearch_documents(opensearch_query, progress, deadline, search)
             
-            relevant_docs_found = True
-            # Get code snippets if available
+            if not documents:
+                return "No documents found for your question."
+
+            # Grade and answer repeated log messages once per template
+            if settings.log_clustering_enabled:
+                documents = cluster_documents(documents)
+                progress.update("cluster", f"🧩 Grouped into {len(documents)} distinct log messages")
+            run.total_docs = len(documents)
+            items = enumerate(documents, 1)
+        
+        # Step 3: Grade, look up code and answer in overlapping stages.
+        # Bounded queues between the stages keep a slow answerer from letting grading run ahead unchecked.
+        # In consolidated mode the last stage only collects documents for one combined answer.
+        max_answered = settings.max_answered_documents
+        relevant_docs = []
+        consolidated = settings.answer_mode == "consolidated"
+        collected: List[Tuple[int, Document, List[Document]]] = []
+
+        async def grade(item: Tuple[int, Document]) -> Optional[Tuple[int, Document]]:
+            doc_num, doc = item
+            progress.update(f"doc-{doc_num}", f"⚖️ Document {doc_num}/{run.total_docs}: grading...")
+            if not await self._grade_single_document(question, doc, deadline):
+                progress.update(f"doc-{doc_num}", f"📄 Document {doc_num}/{run.total_docs}: not relevant, skipped")
+                run.processed_docs += 1
+                return None
+            relevant_docs.append(doc_num)
+            return doc_num, doc
+
+        async def lookup_code(item: Tuple[int, Document]) -> Tuple[int, Document, List[Document]]:
+            doc_num, doc = item
             code_docs = []
             if doc.metadata.get('stack_trace'):
-                code_docs = await self.retrieve_code_docs(telegram_chat_id, doc.metadata['stack_trace'])
-            
-            # Generate and send answer for this document
-            await self.generate_and_send_answer(telegram_chat_id, question, doc, code_docs, i, len(documents))
-        
-        if not relevant_docs_found:
-            await self.bot.send_message(
-                chat_id=telegram_chat_id,
-                text="No relevant documents found to answer your question."
-            )
-
-    async def retrieve_opensearch_documents(self, telegram_chat_id: int, question: str) -> List[Document]:
-        """Retrieve relevant documents for the query."""
-        msg = await self.bot.send_message(
-            chat_id=telegram_chat_id,
-            text="🔍 Retrieving documents..."
-        )
+                code_docs = await self.retrieve_code_docs(doc.metadata['stack_trace'], progress, doc_num, run.total_docs, deadline)
+            return doc_num, doc, code_docs
+
+        started_answers = 0
+
+        async def answer(item: Tuple[int, Document, List[Document]]) -> None:
+            nonlocal started_answers
+            doc_num, doc, code_docs = item
+            # Reserve the answer before sending anything: once the limit is reserved, later documents are
+            # dropped here and the last answer in flight stops the pipeline, so no half-sent answer is cancelled
+            if max_answered and started_answers >= max_answered:
+                return None
+            started_answers += 1
+            run.answers.append(await self.generate_and_send_answer(telegram_chat_id, question, doc, code_docs, doc_num, run.total_docs, progress, deadline))
+            run.processed_docs += 1
+            if max_answered and len(run.answers) >= max_answered:
+                raise StopPipeline()
 
-        docs = await self.opensearch_retriever.ainvoke(question)
-        await self.bot.edit_message_text(
-            chat_id=telegram_chat_id,
-            message_id=msg.message_id,
-            text=f"📚 Retrieved {len(docs)} documents"
+        async def collect(item: Tuple[int, Document, List[Document]]) -> None:
+            doc_num, doc, code_docs = item
+            progress.update(f"doc-{doc_num}", f"📥 Document {doc_num}/{run.total_docs}: relevant, queued for the combined answer")
+            collected.append(item)
+            run.processed_docs += 1
+            if max_answered and len(collected) >= max_answered:
+                raise StopPipeline()
+
+        pipeline = Pipeline(
+            stages=[
+                Stage("grade", grade, settings.retrieval_grader_concurrency),
+                Stage("code_lookup", lookup_code, settings.code_lookup_concurrency),
+                Stage("collect", collect) if consolidated else Stage("answer", answer, settings.answerer_concurrency),
+            ],
+            queue_size=settings.pipeline_queue_size
         )
+        await pipeline.run(items)
+        
+        if not run.total_docs:
+            return "No documents found for your question."
+        if not relevant_docs:
+            return "No relevant documents found to answer your question."
+        if consolidated:
+            run.answers.append(await self.generate_and_send_consolidated_answer(telegram_chat_id, question, collected, progress, deadline))
+        if run.processed_docs < run.total_docs:
+            return f"Stopped after {max_answered} relevant documents, {run.total_docs - run.processed_docs} of {run.total_docs} documents were left unprocessed."
+        return None
+
+    async def translate_question(self, question: str, progress: ProgressReporter, deadline: Deadline) -> Tuple[dict, Optional[asyncio.Task]]:
+        """Translate the question into an OpenSearch query, with the search already started for it, if any."""
+        progress.update("retrieve", "🔍 Translating question...")
+
+        async def translate() -> Tuple[dict, Optional[asyncio.Task]]:
+            async with self.llm_slots:
+                return await self.opensearch_retriever.atranslate_and_search(question)
+
+        return await deadline.run(translate())
+
+    async def retrieve_opensearch_documents(self, opensearch_query: dict, progress: ProgressReporter, deadline: Deadline, search: Optional[asyncio.Task] = None) -> List[Document]:
+        """Retrieve documents for the translated query, reusing a search started during translation."""
+        progress.update("retrieve", "🔍 Retrieving documents...")
+
+        docs = await deadline.run(self.opensearch_retriever.asearch(opensearch_query, search))
+        progress.update("retrieve", f"📚 Retrieved {len(docs)} documents")
         
         return docs
 
-    async def _grade_single_document(self, question: str, doc: Document) -> bool:
+    async def stream_opensearch_documents(self, opensearch_query: dict, progress: ProgressReporter, run: QuestionRun) -> AsyncIterator[Tuple[int, Document]]:
+        """Yield numbered documents page by page, counting them in `run.total_docs` as they arrive.
+
+        Repeated log messages are folded into the first one seen, like `cluster_documents` does.
+        Those representatives are only yielded once all pages are in, so their
+        occurrences include repeats found on later pages; memory stays bounded
+        since each one lists at most `settings.log_cluster_max_occurrences`.
+        """
+        progress.update("retrieve", "🔍 Retrieving documents...")
+        clusterer = DocumentClusterer() if settings.log_clustering_enabled else None
+        fetched = 0
+        pages = self.opensearch_retriever.astream_documents(opensearch_query)
+        try:
+            while True:
+                try:
+                    page = await run.deadline.run(pages.__anext__())
+                except StopAsyncIteration:
+                    break
+                fetched += len(page)
+                for doc in page:
+                    if clusterer is not None:
+                        clusterer.add(doc)
+                        continue
+                    run.total_docs += 1
+                    yield run.total_docs, doc
+                distinct = len(clusterer.clusters) if clusterer is not None else run.total_docs
+                progress.update("retrieve", f"📚 Retrieved {fetched} documents, {distinct} distinct so far")
+        finally:
+            await pages.aclose()
+
+        if clusterer is not None:
+            for doc in clusterer.clusters.values():
+                run.total_docs += 1
+                yield run.total_docs, doc
+
+    async def replay_cached_response(self, telegram_chat_id: int, cached: dict, progress: ProgressReporter) -> None:
+        """Send the answers stored for an identical recent question."""
+        progress.update("retrieve", f"♻️ Same question was answered recently, replaying {len(cached['answers'])} answer(s)")
+        for answer in cached["answers"]:
+            stream = TelegramMessageStream(self.bot, telegram_chat_id)
+            await stream.write(answer)
+            await stream.finish()
+        if cached["result"]:
+            progress.update("result", cached["result"])
+
+    async def _grade_single_document(self, question: str, doc: Document, deadline: Deadline) -> bool:
         """Grade a single document for relevance."""
-        grade = await self.retrieval_grader.ainvoke(
-            question=question,
-            document=f"{doc.page_content} \n\n {doc.metadata}"
-        )
+        async def grade_document() -> str:
+            async with self.llm_slots:
+                return await self.retrieval_grader.ainvoke(
+                    question=question,
+                    document=f"{doc.page_content} \n\n {self._grading_metadata(doc)}"
+                )
+
+        grade = await deadline.run(grade_document())
         print(f"---DOC: {doc.metadata['time']} {doc.page_content[:100]}... GRADE: {grade}---")
         return grade == "yes"
 
-    async def retrieve_code_docs(self, telegram_chat_id: int, stack_trace: str) -> List[Document]:
+    @staticmethod
+    def _grading_metadata(doc: Document) -> dict:
+        """Metadata shown to the grader, without the per-occurrence details of a cluster."""
+        return {key: value for key, value in doc.metadata.items() if key != "occurrences"}
+
+    async def retrieve_code_docs(self, stack_trace: str, progress: ProgressReporter, doc_num: int, total_docs: int, deadline: Deadline) -> List[Document]:
         """Retrieve relevant code documents for the stack trace."""
-        msg = await self.bot.send_message(
-            chat_id=telegram_chat_id,
-            text="🔍 Searching codebase for relevant files..."
-        )
+        progress.update(f"doc-{doc_num}", f"🔍 Document {doc_num}/{total_docs}: searching codebase for relevant files...")
 
-        code_docs = await self.code_base_retriever.ainvoke(stack_trace)
+        async def lookup() -> List[Document]:
+            async with self.llm_slots:
+                return await self.code_base_retriever.ainvoke(stack_trace)
+
+        code_docs = await deadline.run(lookup())
         
         # Get list of unique file names
         file_names = set(doc.metadata.get('filename', 'Unknown') for doc in code_docs)
-        file_list = "\n".join(f"• {name}" for name in sorted(file_names))
+        file_list = ", ".join(sorted(file_names))
         
-        # Format stack trace for display
-        stack_trace_lines = stack_trace.split('\n')
-        formatted_stack = "\n".join(f"  {line}" for line in stack_trace_lines)
-        
-        await self.bot.edit_message_text(
-            chat_id=telegram_chat_id,
-            message_id=msg.message_id,
-            text=f"🔍 Searching for code related to stack trace:\n```\n{formatted_stack}\n```\n\n📚 Found {len(code_docs)} relevant code files:\n{file_list}"
-        )
+        progress.update(f"doc-{doc_num}", f"📚 Document {doc_num}/{total_docs}: found {len(code_docs)} relevant code files: {file_list}")
         
         return code_docs
 
-    async def generate_and_send_answer(self, telegram_chat_id: int, question: str, doc: Document, code_docs: List[Document], doc_num: int, total_docs: int) -> None:
+    async def generate_and_send_answer(self, telegram_chat_id: int, question: str, doc: Document, code_docs: List[Document], doc_num: int, total_docs: int, progress: ProgressReporter, deadline: Deadline) -> str:
         """Generate and send answer for a single document and its associated code snippets."""
-        msg = await self.bot.send_message(
-            chat_id=telegram_chat_id,
-            text=f"🤖 Generating answer for document {doc_num}/{total_docs}..."
-        )
+        progress.update(f"doc-{doc_num}", f"🤖 Document {doc_num}/{total_docs}: generating answer...")
 
         # Prepare context and code snippets
         context = f"Log Entry:\n{doc.page_content}"
+        occurrences = format_occurrences(doc)
+        if occurrences:
+            context = f"{context}\n\n{occurrences}"
         code_context = ""
         stack_trace = doc.metadata.get('stack_trace', '')
         
@@ -134,18 +334,65 @@ class ChatChain:
             "stack_trace": stack_trace
         }
         
-        response = await self.answerer.ainvoke(answerer_input)
+        answer = await deadline.run(self._send_answer(telegram_chat_id, f"📝 Answer for document {doc_num}/{total_docs}:\n\n", answerer_input))
+        progress.update(f"doc-{doc_num}", f"✅ Document {doc_num}/{total_docs}: processed")
+        return answer
 
-        # Send the answer
-        await self.bot.send_message(
-            chat_id=telegram_chat_id,
-            text=f"📝 Answer for document {doc_num}/{total_docs}:\n\n{response}"
-        )
-        
-        # Update status message
-        await self.bot.edit_message_text(
-            chat_id=telegram_chat_id,
-            message_id=msg.message_id,
-            text=f"✅ Processed document {doc_num}/{total_docs}"
-        )
+    async def generate_and_send_consolidated_answer(self, telegram_chat_id: int, question: str, relevant: List[Tuple[int, Document, List[Document]]], progress: ProgressReporter, deadline: Deadline) -> str:
+        """Generate and send one answer for all relevant documents, packed into the context budget."""
+        packed = pack_context(rank_documents(relevant), settings.answer_context_budget_tokens)
+        skipped = f", {packed.skipped} left out to fit the context" if packed.skipped else ""
+        progress.update("answer", f"🤖 Generating one answer for {packed.packed} relevant documents{skipped}...")
+
+        answerer_input = {
+            "context": packed.context,
+            "question": question,
+            "code_context": packed.code_context,
+            "stack_trace": packed.stack_trace
+        }
+
+        answer = await deadline.run(self._send_answer(telegram_chat_id, f"📝 Answer based on {packed.packed} relevant documents:\n\n", answerer_input))
+        progress.update("answer", f"✅ Answered from {packed.packed} relevant documents{skipped}")
+        return answer
+
+    async def generate_and_send_aggregation_answer(self, telegram_chat_id: int, question: str, opensearch_query: dict, aggregation: AggregationRequest, progress: ProgressReporter, deadline: Deadline) -> str:
+        """Count the matching log entries on the cluster and answer from the counts."""
+        progress.update("retrieve", "📊 Counting matching log entries...")
+        summary = await deadline.run(self.opensearch_retriever.aaggregate(opensearch_query, aggregation))
+        progress.update("retrieve", f"📊 {summary.splitlines()[0]}")
+
+        answerer_input = {
+            "context": summary,
+            "question": question,
+            "code_context": "",
+            "stack_trace": ""
+        }
+
+        answer = await deadline.run(self._send_answer(telegram_chat_id, "📊 Answer based on log counts:\n\n", answerer_input))
+        progress.update("answer", "✅ Answered from aggregated counts")
+        return answer
+
+    async def _send_answer(self, telegram_chat_id: int, header: str, answerer_input: dict) -> str:
+        """Run the answerer and send its response, streamed or in one message.
+
+        Returns:
+            The full text that was sent
+        """
+        async with self.llm_slots:
+            if settings.answer_streaming:
+                # Stream tokens into the chat as they are generated
+                stream = TelegramMessageStream(self.bot, telegram_chat_id, header=header)
+                chunks = []
+                async for chunk in self.answerer.astream(answerer_input):
+                    chunks.append(chunk)
+                    await stream.write(chunk)
+                await stream.finish()
+                response = "".join(chunks)
+            else:
+                response = await self.answerer.ainvoke(answerer_input)
+                await self.bot.send_message(
+                    chat_id=telegram_chat_id,
+                    text=f"{header}{response}"
+                )
+        return f"{header}{response}"
         
\ No newline at end of file